@@ -0,0 +1,186 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Benchmarks how long clam takes to import and how long a shelf tool waits for
+# a Clam object: building a new Clam each time (as the shelf tools used to)
+# against the cached get_clam(). Also times the inspect.stack() call that Clam
+# used to make to find its own directory, at a stack as deep as one inside a
+# busy clarisse session, against using __file__. Needs bvzlib and squirrel on
+# the PYTHONPATH for everything but the stack timing.
+#
+#     python benchmarks/bench_construction.py [--runs 20] [--depth 200]
+
+import argparse
+import inspect
+import os
+import subprocess
+import sys
+import time
+
+BENCHMARKS_D = os.path.dirname(os.path.abspath(__file__))
+CLAM_D = os.path.abspath(os.path.join(BENCHMARKS_D, "..", "modules", "clam"))
+MODULES_D = os.path.dirname(CLAM_D)
+sys.path.insert(0, CLAM_D)
+sys.path.insert(1, MODULES_D)
+
+IMPORT_SCRIPT = ("import time\n"
+                 "start = time.time()\n"
+                 "import clam\n"
+                 "print(time.time() - start)\n")
+
+
+# ------------------------------------------------------------------------------
+def median(values):
+    """
+    :param values: A list of numbers.
+
+    :return: The median of the numbers.
+    """
+
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+# ------------------------------------------------------------------------------
+def time_import(runs):
+    """
+    Times a cold "import clam", each in a new python process.
+
+    :param runs: The number of times to import clam.
+
+    :return: The median import time in seconds.
+    """
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([path for path in
+                                         [CLAM_D, MODULES_D,
+                                          env.get("PYTHONPATH")] if path])
+
+    times = list()
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT],
+                                         env=env,
+                                         universal_newlines=True)
+        times.append(float(output.strip().splitlines()[-1]))
+    return median(times)
+
+
+# ------------------------------------------------------------------------------
+def time_call(function,
+              runs):
+    """
+    Times a function.
+
+    :param function: The function to call (with no arguments).
+    :param runs: The number of times to call it.
+
+    :return: The median time of a call in seconds.
+    """
+
+    times = list()
+    for _ in range(runs):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return median(times)
+
+
+# ------------------------------------------------------------------------------
+def at_depth(depth,
+             function):
+    """
+    Calls a function from beneath a number of stack frames.
+
+    :param depth: How many frames deep to call the function from.
+    :param function: The function to call (with no arguments).
+
+    :return: Whatever the function returns.
+    """
+
+    if depth <= 0:
+        return function()
+    return at_depth(depth - 1, function)
+
+
+# ------------------------------------------------------------------------------
+def module_d_from_stack():
+    """
+    :return: This module's directory, found the way Clam used to find its own.
+    """
+
+    return os.path.split(inspect.stack()[0][1])[0]
+
+
+# ------------------------------------------------------------------------------
+def module_d_from_file():
+    """
+    :return: This module's directory, found the way Clam finds it now.
+    """
+
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+# ------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks importing clam and building Clam objects.")
+    parser.add_argument("--runs",
+                        type=int,
+                        default=20,
+                        help="The number of times to time each step.")
+    parser.add_argument("--depth",
+                        type=int,
+                        default=200,
+                        help="The stack depth to time inspect.stack() at.")
+    args = parser.parse_args()
+
+    stack_s = at_depth(args.depth, lambda: time_call(module_d_from_stack,
+                                                     args.runs))
+    file_s = at_depth(args.depth, lambda: time_call(module_d_from_file,
+                                                    args.runs))
+    print("module dir at depth {0}:".format(args.depth))
+    print("    inspect.stack(): {0:10.3f} ms".format(stack_s * 1000))
+    print("    __file__:        {0:10.3f} ms".format(file_s * 1000))
+
+    try:
+        import clam
+    except ImportError as e:
+        print("skipping the import and construction timings: " + str(e))
+        return
+
+    print("import clam (new process): {0:10.3f} ms".format(
+        time_import(args.runs) * 1000))
+
+    clam.get_clam()
+    new_s = time_call(clam.Clam, args.runs)
+    cached_s = time_call(clam.get_clam, args.runs)
+    print("Clam():                    {0:10.3f} ms".format(new_s * 1000))
+    print("get_clam() (cached):       {0:10.3f} ms".format(cached_s * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Benchmarks the project path rewriter (remapper.PathRewriter) against the
+# original munge_project loop (one line.replace and os.path.relpath per key
+# per line) with a synthetic remap table and project (10k keys and 1M lines by
+# default). The original loop is far too slow to run over the whole project,
+# so it is timed on the first --baseline-lines lines and scaled up.
+#
+#     python benchmarks/bench_munge.py [--keys 10000] [--lines 1000000]
+
+import argparse
+import os
+import sys
+import time
+
+BENCHMARKS_D = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_D, "..", "modules", "clam"))
+
+import remapper
+
+PROJECT_P = "/projects/show/shots/sh010/lighting/sh010_lighting.project"
+GATHER_D = "/projects/show/publish/sh010_lighting/v001"
+
+# One line in this many holds a reference to a remapped file.
+REFERENCE_EVERY = 20
+
+
+# ------------------------------------------------------------------------------
+def build_remapped(key_count):
+    """
+    Builds a synthetic remap table.
+
+    :param key_count: The number of remapped files.
+
+    :return: A dict of original path to gathered path.
+    """
+
+    remapped = dict()
+    for i in range(key_count):
+        source_p = "/projects/show/assets/asset_{0:03d}/tex/map_{1:05d}.tx"
+        source_p = source_p.format(i % 500, i)
+        remapped[source_p] = os.path.join(GATHER_D, "tex",
+                                          os.path.basename(source_p))
+    return remapped
+
+
+# ------------------------------------------------------------------------------
+def build_lines(line_count,
+                keys):
+    """
+    Builds the lines of a synthetic project: mostly numbers, with a quoted
+    reference to one of the remapped files every REFERENCE_EVERY lines.
+
+    :param line_count: The number of lines.
+    :param keys: The remapped paths to refer to.
+
+    :return: A list of lines.
+    """
+
+    numbers = " ".join("{0:.6f}".format(i * 0.37) for i in range(12))
+    lines = list()
+    for i in range(line_count):
+        if i % REFERENCE_EVERY == 0:
+            key = keys[(i // REFERENCE_EVERY) % len(keys)]
+            lines.append('        filename "{0}"\n'.format(key))
+        else:
+            lines.append("            " + numbers + "\n")
+    return lines
+
+
+# ------------------------------------------------------------------------------
+def baseline_munge(lines,
+                   remapped,
+                   project_p):
+    """
+    The loop that munge_project used to run over each line.
+
+    :param lines: The lines of the project.
+    :param remapped: The dict of original path to gathered path.
+    :param project_p: The path of the project being munged.
+
+    :return: The rewritten lines.
+    """
+
+    project_parent_d = os.path.split(project_p)[0]
+
+    output = list()
+    for line in lines:
+        for key in remapped:
+            if key in line:
+                rel_path = os.path.relpath(remapped[key], project_parent_d)
+                rel_path = os.path.join("$PDIR", rel_path)
+                line = line.replace(key, rel_path)
+        output.append(line)
+    return output
+
+
+# ------------------------------------------------------------------------------
+def rewriter_munge(lines,
+                   rewriter):
+    """
+    Rewrites each line with a PathRewriter.
+
+    :param lines: The lines of the project.
+    :param rewriter: The PathRewriter to use.
+
+    :return: The rewritten lines.
+    """
+
+    return [rewriter.rewrite(line) for line in lines]
+
+
+# ------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the project path rewriter.")
+    parser.add_argument("--keys",
+                        type=int,
+                        default=10000,
+                        help="The number of remapped files.")
+    parser.add_argument("--lines",
+                        type=int,
+                        default=1000000,
+                        help="The number of lines in the project.")
+    parser.add_argument("--baseline-lines",
+                        type=int,
+                        default=2000,
+                        help="The number of lines to time the original loop "
+                             "on (its time is scaled up to --lines).")
+    args = parser.parse_args()
+
+    remapped = build_remapped(args.keys)
+    lines = build_lines(args.lines, sorted(remapped))
+    gather_project_p = os.path.join(GATHER_D, os.path.basename(PROJECT_P))
+
+    start = time.time()
+    rewriter = remapper.PathRewriter(remapped, gather_project_p)
+    build_s = time.time() - start
+
+    start = time.time()
+    rewritten = rewriter_munge(lines, rewriter)
+    rewrite_s = time.time() - start
+
+    sample = lines[:args.baseline_lines]
+    start = time.time()
+    baseline = baseline_munge(sample, remapped, gather_project_p)
+    baseline_s = (time.time() - start) * len(lines) / float(len(sample))
+
+    if baseline != rewritten[:len(sample)]:
+        sys.exit("The rewriter and the original loop disagree.")
+
+    print("{0} keys, {1} lines".format(args.keys, args.lines))
+    print("original loop: {0:10.2f} s (scaled from {1} lines)".format(
+        baseline_s, len(sample)))
+    print("PathRewriter:  {0:10.2f} s ({1:.2f} s to build the matcher)".format(
+        build_s + rewrite_s, build_s))
+    print("speed up:      {0:10.1f}x".format(
+        baseline_s / (build_s + rewrite_s)))
+
+
+if __name__ == "__main__":
+    main()
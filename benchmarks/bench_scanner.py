@@ -0,0 +1,259 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Benchmarks the project scanner against the original readlines() scanner on
+# synthetic projects (100 MB and 1 GB by default), reporting the wall time and
+# peak RSS of each. Each scan runs in its own python process so that the peak
+# RSS of one does not hide the other.
+#
+#     python benchmarks/bench_scanner.py [--sizes 100,1000] [--dir DIR]
+
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_D = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_D, "..", "modules", "clam"))
+
+import scanner
+
+VARIANTS = ["baseline", "streaming"]
+
+# The number of real files the synthetic project references.
+REFERENCED_FILE_COUNT = 200
+
+# The fraction of the project that comes before the #preferences section.
+PREFERENCES_AT = 0.9
+
+
+# ------------------------------------------------------------------------------
+def baseline_references(project_p):
+    """
+    The scanner that find_all_file_references_in_project used to be: the
+    whole file is read with readlines() and every line is searched.
+
+    :param project_p: The path to the project to scan.
+
+    :return: A list of all the files referenced in this project.
+    """
+
+    files = list()
+
+    file_pattern = r'"(?:[^"\\]|\\.)*"'
+
+    with open(project_p, "r") as f:
+        lines = f.readlines()
+
+    for line in lines:
+        if line.strip().lower().startswith("#preferences"):
+            break
+
+        potential_files = re.findall(file_pattern, line)
+        if potential_files:
+            for file_name in potential_files:
+                file_name = file_name.strip('"')
+                if os.path.exists(file_name) and os.path.isfile(file_name):
+                    files.append(file_name)
+
+    return files
+
+
+# ------------------------------------------------------------------------------
+def streaming_references(project_p):
+    """
+    The current scanner.
+
+    :param project_p: The path to the project to scan.
+
+    :return: A list of all the files referenced in this project.
+    """
+
+    return list(scanner.iter_file_references(project_p))
+
+
+# ------------------------------------------------------------------------------
+def peak_rss_mb():
+    """
+    :return: The peak resident set size of this process in megabytes.
+    """
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0)
+    return max_rss / 1024.0
+
+
+# ------------------------------------------------------------------------------
+def write_project(project_p,
+                  size_mb,
+                  files_d):
+    """
+    Writes a synthetic project: mostly lines of numbers (like baked geometry
+    and attribute arrays), with quoted paths to real files and other quoted
+    strings scattered through it, then a #preferences section followed by
+    more numbers.
+
+    :param project_p: The path of the project to write.
+    :param size_mb: The approximate size of the project in megabytes.
+    :param files_d: The directory to create the referenced files in.
+
+    :return: Nothing.
+    """
+
+    referenced = list()
+    for i in range(REFERENCED_FILE_COUNT):
+        file_p = os.path.join(files_d, "texture_{0:04d}.tx".format(i))
+        with open(file_p, "w") as f:
+            f.write("x")
+        referenced.append(file_p)
+
+    numbers = " ".join("{0:.6f}".format(i * 0.37) for i in range(12))
+    block_lines = list()
+    for i in range(1000):
+        if i % 250 == 0:
+            block_lines.append('        filename "{0}"\n')
+        elif i % 100 == 0:
+            block_lines.append('        name "not_a_file_{0}"\n'.format(i))
+        else:
+            block_lines.append("            " + numbers + "\n")
+    block = "".join(block_lines)
+
+    size = size_mb * 1024 * 1024
+    with open(project_p, "w") as f:
+        f.write("#Isotropix_Serial_Version 1.0\n")
+        written = 0
+        i = 0
+        while written < size * PREFERENCES_AT:
+            chunk = block.format(referenced[i % len(referenced)])
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+        f.write("#preferences\n")
+        while written < size:
+            chunk = block.replace("{0}", "/preferences/only.tx")
+            f.write(chunk)
+            written += len(chunk)
+
+
+# ------------------------------------------------------------------------------
+def run_variant(variant,
+                project_p):
+    """
+    Scans a project with one variant in a new python process.
+
+    :param variant: One of VARIANTS.
+    :param project_p: The project to scan.
+
+    :return: A dict with the wall time (seconds), the peak RSS (MB) and the
+             number of references found.
+    """
+
+    output = subprocess.check_output([sys.executable,
+                                      os.path.abspath(__file__),
+                                      "--run", variant,
+                                      project_p],
+                                     universal_newlines=True)
+    return json.loads(output)
+
+
+# ------------------------------------------------------------------------------
+def measure(variant,
+            project_p):
+    """
+    Runs one variant in this process and prints its measurements as json. Used
+    by run_variant.
+
+    :param variant: One of VARIANTS.
+    :param project_p: The project to scan.
+
+    :return: Nothing.
+    """
+
+    scan = {"baseline": baseline_references,
+            "streaming": streaming_references}[variant]
+
+    start = time.time()
+    references = scan(project_p)
+    wall = time.time() - start
+
+    print(json.dumps({"wall": wall,
+                      "peak_rss_mb": peak_rss_mb(),
+                      "references": len(references)}))
+
+
+# ------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the project scanner.")
+    parser.add_argument("--sizes",
+                        default="100,1000",
+                        help="Comma separated project sizes in MB.")
+    parser.add_argument("--dir",
+                        default=None,
+                        help="Where to write the synthetic projects. Defaults "
+                             "to a temporary directory that is removed "
+                             "afterwards.")
+    parser.add_argument("--run",
+                        nargs=2,
+                        metavar=("VARIANT", "PROJECT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        measure(*args.run)
+        return
+
+    work_d = args.dir or tempfile.mkdtemp(prefix="bench_scanner_")
+    try:
+        files_d = os.path.join(work_d, "files")
+        if not os.path.isdir(files_d):
+            os.makedirs(files_d)
+
+        print("{0:>8}  {1:>10}  {2:>10}  {3:>12}  {4:>10}".format(
+            "size MB", "variant", "wall s", "peak RSS MB", "references"))
+
+        for size_mb in [int(size) for size in args.sizes.split(",")]:
+            project_p = os.path.join(work_d, "synthetic_{0}mb.project".format(
+                size_mb))
+            write_project(project_p, size_mb, files_d)
+            for variant in VARIANTS:
+                result = run_variant(variant, project_p)
+                print("{0:>8}  {1:>10}  {2:>10.2f}  {3:>12.1f}  {4:>10}".format(
+                    size_mb, variant, result["wall"], result["peak_rss_mb"],
+                    result["references"]))
+            os.remove(project_p)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(work_d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+try:
+    import ix
+except ImportError:
+    ix = None
+
+
+# ==============================================================================
+class ObjectRef(object):
+
+    """
+    Stands in for the full name of an object in an AssetPlan that does not
+    exist yet. Resolved when the plan is built.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 key):
+        """
+        Initialize the object.
+
+        :param key: The key of the object in the plan.
+
+        :return: Nothing.
+        """
+
+        self.key = key
+
+
+# ==============================================================================
+class AssetPlan(object):
+
+    """
+    A description of everything that makes up an empty asset structure
+    (contexts, objects, attribute values, items to move into it and shading
+    layer rules), built without touching clarisse. An AssetBuilder then turns
+    any number of plans into as few clarisse commands as possible.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 name,
+                 asset_url):
+        """
+        Initialize the object.
+
+        :param name: The name of the asset.
+        :param asset_url: The full url of the asset context.
+
+        :return: Nothing.
+        """
+
+        self.name = name
+        self.asset_url = asset_url
+
+        self.contexts = [asset_url]
+        self.objects = list()
+        self.set_values = list()
+        self.add_values = list()
+        self.moves = list()
+        self.shading_rules = list()
+
+    # --------------------------------------------------------------------------
+    def add_context(self,
+                    url):
+        """
+        Adds a context (created after its parents, in the order added).
+
+        :param url: The full url of the context.
+
+        :return: The url.
+        """
+
+        self.contexts.append(url)
+        return url
+
+    # --------------------------------------------------------------------------
+    def add_object(self,
+                   key,
+                   name,
+                   class_name,
+                   *args):
+        """
+        Adds an object.
+
+        :param key: A key that identifies this object within the plan.
+        :param name: The name of the object.
+        :param class_name: The clarisse class of the object.
+        :param args: Any further arguments passed to ix.cmds.CreateObject (for
+               example, "Global" and the url of the parent context).
+
+        :return: An ObjectRef to the object.
+        """
+
+        self.objects.append((key, name, class_name, args))
+        return ObjectRef(key)
+
+    # --------------------------------------------------------------------------
+    def set_value(self,
+                  item,
+                  attr,
+                  value):
+        """
+        Sets the value of an attribute.
+
+        :param item: The ObjectRef (or full name) of the item.
+        :param attr: The attribute (e.g. "inclusion_rule[0]").
+        :param value: The value. May be an ObjectRef.
+
+        :return: Nothing.
+        """
+
+        self.set_values.append((item, attr, value))
+
+    # --------------------------------------------------------------------------
+    def add_value(self,
+                  item,
+                  attr,
+                  value):
+        """
+        Adds a value to a list attribute.
+
+        :param item: The ObjectRef (or full name) of the item.
+        :param attr: The attribute (e.g. "objects").
+        :param value: The value. May be an ObjectRef.
+
+        :return: Nothing.
+        """
+
+        self.add_values.append((item, attr, value))
+
+    # --------------------------------------------------------------------------
+    def move_item(self,
+                  item_name,
+                  dest_url):
+        """
+        Moves an existing item into the asset structure.
+
+        :param item_name: The full name of the existing item.
+        :param dest_url: The url of the context to move it into.
+
+        :return: Nothing.
+        """
+
+        self.moves.append((item_name, dest_url))
+
+    # --------------------------------------------------------------------------
+    def add_shading_rule(self,
+                         shading_layer,
+                         filter_str,
+                         material):
+        """
+        Adds a rule to a shading layer that assigns a material.
+
+        :param shading_layer: The ObjectRef of the shading layer.
+        :param filter_str: The filter of the rule.
+        :param material: The ObjectRef of the material.
+
+        :return: Nothing.
+        """
+
+        self.shading_rules.append((shading_layer, filter_str, material))
+
+
+# ==============================================================================
+class AssetBuilder(object):
+
+    """
+    Builds any number of AssetPlans in a single clarisse command batch (one
+    undo step). Every attribute value across every plan is set with one
+    SetValues call and one AddValues call, and items are moved with one
+    MoveItemsTo call per destination.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Initialize the object.
+
+        :return: Nothing.
+        """
+
+        self.plans = list()
+
+    # --------------------------------------------------------------------------
+    def add(self,
+            plan):
+        """
+        Adds a plan to be built.
+
+        :param plan: The AssetPlan.
+
+        :return: Nothing.
+        """
+
+        self.plans.append(plan)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _resolve(value,
+                 created):
+        """
+        :param value: A value from a plan, possibly an ObjectRef.
+        :param created: The dictionary of objects created for that plan.
+
+        :return: The value, with any ObjectRef replaced by the full name of the
+                 object.
+        """
+
+        if isinstance(value, ObjectRef):
+            return created[value.key].get_full_name()
+        return value
+
+    # --------------------------------------------------------------------------
+    def build(self,
+              batch_name="clam create assets"):
+        """
+        Builds every plan.
+
+        :param batch_name: The name of the command batch (shown in clarisse's
+               undo history). Defaults to "clam create assets".
+
+        :return: A list with the asset context of each plan, in the order the
+                 plans were added.
+        """
+
+        from libClarisse import libClarisse
+
+        asset_contexts = list()
+
+        set_attrs = list()
+        set_values = list()
+        add_attrs = list()
+        add_values = list()
+        moves = dict()
+        rules = list()
+
+        ix.begin_command_batch(batch_name)
+        try:
+            for plan in self.plans:
+
+                contexts = [libClarisse.create_context(url)
+                            for url in plan.contexts]
+                asset_contexts.append(contexts[0])
+
+                created = dict()
+                for key, name, class_name, args in plan.objects:
+                    created[key] = ix.cmds.CreateObject(name, class_name, *args)
+
+                for item, attr, value in plan.set_values:
+                    set_attrs.append(self._resolve(item, created) + "." + attr)
+                    set_values.append(self._resolve(value, created))
+
+                for item, attr, value in plan.add_values:
+                    add_attrs.append(self._resolve(item, created) + "." + attr)
+                    add_values.append(self._resolve(value, created))
+
+                for item_name, dest_url in plan.moves:
+                    moves.setdefault(dest_url, list()).append(item_name)
+
+                for shading_layer, filter_str, material in plan.shading_rules:
+                    rules.append((self._resolve(shading_layer, created),
+                                  filter_str,
+                                  self._resolve(material, created)))
+
+            if set_attrs:
+                ix.cmds.SetValues(set_attrs, set_values)
+            if add_attrs:
+                ix.cmds.AddValues(add_attrs, add_values)
+            for dest_url in moves:
+                ix.cmds.MoveItemsTo(moves[dest_url], dest_url)
+
+            # Shading layer rules can only be edited one layer at a time
+            for shading_layer_n, filter_str, material_n in rules:
+                ix.cmds.AddShadingLayerRule(shading_layer_n,
+                                            0,
+                                            ["filter", "", "is_visible", "1"])
+                ix.cmds.SetShadingLayerRulesProperty(shading_layer_n,
+                                                     [0],
+                                                     "filter",
+                                                     [filter_str])
+                ix.cmds.SetShadingLayerRulesProperty(shading_layer_n,
+                                                     [0],
+                                                     "material",
+                                                     [material_n])
+        finally:
+            ix.end_command_batch()
+
+        return asset_contexts
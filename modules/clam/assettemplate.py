@@ -0,0 +1,313 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+import os
+import threading
+
+import assetbuilder
+
+
+TEMPLATE_ENV_VAR = "CLAM_ASSET_TEMPLATE_PATH"
+
+KINDS = ["context", "object", "shading_rule", "existing_geo"]
+ASSET_KEY = "asset"
+
+_templates = dict()
+_templates_lock = threading.Lock()
+
+
+# ------------------------------------------------------------------------------
+def _check_format(value):
+    """
+    Raises a ValueError if a template value uses an unknown placeholder.
+
+    :param value: The value from the template.
+
+    :return: The value.
+    """
+
+    try:
+        value.format(name="", var="", index=0)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError("Bad placeholder in \"" + value + "\": " + str(e))
+
+    return value
+
+
+# ==============================================================================
+class AssetTemplate(object):
+
+    """
+    An asset layout read from a template file and compiled into a flat list of
+    operations. The template is parsed and checked once. Turning it into an
+    AssetPlan for a particular asset only fills in names.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 template_p):
+        """
+        Initialize the object by reading and compiling a template. Raises a
+        ValueError if the template is invalid.
+
+        :param template_p: The path to the template file.
+
+        :return: Nothing.
+        """
+
+        self.template_p = template_p
+        self.ops = list()
+
+        parser = configparser.RawConfigParser()
+        parser.optionxform = str  # attribute names are case sensitive
+        try:
+            if not parser.read(template_p):
+                raise ValueError("Unable to read " + template_p)
+        except configparser.Error as e:
+            raise ValueError(str(e))
+
+        self._compile(parser)
+
+    # --------------------------------------------------------------------------
+    def _compile(self,
+                 parser):
+        """
+        Turns the sections of a template into self.ops, checking every
+        reference along the way.
+
+        :param parser: The parser holding the template.
+
+        :return: Nothing.
+        """
+
+        # Maps each key defined so far to whether it is per variant
+        contexts = {ASSET_KEY: False}
+        objects = dict()
+
+        def get(section, option):
+            if not parser.has_option(section, option):
+                raise ValueError("Section [" + section + "] is missing the \"" +
+                                 option + "\" option.")
+            return parser.get(section, option)
+
+        def get_bool(section, option):
+            if not parser.has_option(section, option):
+                return False
+            return parser.getboolean(section, option)
+
+        def check_ref(section, keys, key, per_variant):
+            if key not in keys:
+                raise ValueError("Section [" + section + "] refers to \"" +
+                                 key + "\", which is not defined above it.")
+            if keys[key] and not per_variant:
+                raise ValueError("Section [" + section + "] refers to \"" +
+                                 key + "\", which is per variant, but is not "
+                                 "per variant itself.")
+            return key
+
+        def value(section, text, per_variant):
+            if text.startswith("@"):
+                return ("ref", check_ref(section, objects, text[1:],
+                                         per_variant))
+            return ("text", _check_format(text))
+
+        for section in parser.sections():
+
+            kind, sep, key = section.partition(":")
+            if kind not in KINDS:
+                raise ValueError("Unknown section [" + section + "]. Must be "
+                                 "one of: " + ", ".join(KINDS))
+            if kind != "existing_geo" and not key:
+                raise ValueError("Section [" + section + "] needs a key "
+                                 "(e.g. [" + kind + ":my_key]).")
+
+            per_variant = get_bool(section, "per_variant")
+
+            if kind == "context":
+                self.ops.append(("context",
+                                 key,
+                                 per_variant,
+                                 _check_format(get(section, "path"))))
+                contexts[key] = per_variant
+
+            elif kind == "object":
+                parent = check_ref(section, contexts, get(section, "parent"),
+                                   per_variant)
+                sets = list()
+                adds = list()
+                for option in parser.options(section):
+                    if option.startswith("set."):
+                        sets.append((option[4:], value(
+                            section, parser.get(section, option), per_variant)))
+                    elif option.startswith("add."):
+                        adds.append((option[4:], value(
+                            section, parser.get(section, option), per_variant)))
+                self.ops.append(("object",
+                                 key,
+                                 per_variant,
+                                 _check_format(get(section, "name")),
+                                 get(section, "class"),
+                                 parent,
+                                 get_bool(section, "global")))
+                objects[key] = per_variant
+                for attr, attr_value in sets:
+                    self.ops.append(("set", key, per_variant, attr, attr_value))
+                for attr, attr_value in adds:
+                    self.ops.append(("add", key, per_variant, attr, attr_value))
+
+            elif kind == "shading_rule":
+                self.ops.append(("shading_rule",
+                                 key,
+                                 per_variant,
+                                 check_ref(section, objects,
+                                           get(section, "layer"), per_variant),
+                                 _check_format(get(section, "filter")),
+                                 check_ref(section, objects,
+                                           get(section, "material"),
+                                           per_variant)))
+
+            else:
+                context = get(section, "context")
+                check_ref(section, contexts, context, True)
+                self.ops.append(("existing_geo",
+                                 key,
+                                 contexts[context],
+                                 context))
+
+    # --------------------------------------------------------------------------
+    def plan(self,
+             name,
+             context_url,
+             variant_count=1,
+             existing_geo=None):
+        """
+        Replays the compiled template for a single asset.
+
+        :param name: The name of the asset.
+        :param context_url: The url of the context the asset is created in.
+        :param variant_count: The number of variants. Defaults to 1.
+        :param existing_geo: An optional list of the full names of existing
+               items to move into the asset. Defaults to None.
+
+        :return: An AssetPlan.
+        """
+
+        asset_url = "/".join([context_url, name])
+        plan = assetbuilder.AssetPlan(name, asset_url)
+
+        variants = [("var" + str(i + 1), i + 1) for i in range(variant_count)]
+        asset_only = [("", 0)]
+
+        # Keyed on (key, variant name), with "" for anything not per variant
+        urls = {(ASSET_KEY, ""): asset_url}
+        refs = dict()
+
+        def lookup(table, key, var):
+            if (key, var) in table:
+                return table[(key, var)]
+            return table[(key, "")]
+
+        def resolve(attr_value, var, index):
+            if attr_value[0] == "ref":
+                return lookup(refs, attr_value[1], var)
+            return attr_value[1].format(name=name, var=var, index=index)
+
+        for op in self.ops:
+            kind, key, per_variant = op[:3]
+
+            if kind == "existing_geo":
+                if existing_geo:
+                    if per_variant:
+                        for existing_n, (var, index) in zip(existing_geo,
+                                                            variants):
+                            plan.move_item(existing_n,
+                                           lookup(urls, op[3], var))
+                    else:
+                        for existing_n in existing_geo:
+                            plan.move_item(existing_n,
+                                           lookup(urls, op[3], ""))
+                continue
+
+            for var, index in (variants if per_variant else asset_only):
+
+                if kind == "context":
+                    path = op[3].format(name=name, var=var, index=index)
+                    urls[(key, var)] = plan.add_context(
+                        "/".join([asset_url, path]))
+
+                elif kind == "object":
+                    obj_name, class_name, parent, is_global = op[3:]
+                    args = [lookup(urls, parent, var)]
+                    if is_global:
+                        args.insert(0, "Global")
+                    refs[(key, var)] = plan.add_object(
+                        key + ":" + var,
+                        obj_name.format(name=name, var=var, index=index),
+                        class_name,
+                        *args)
+
+                elif kind == "set":
+                    plan.set_value(lookup(refs, key, var), op[3],
+                                   resolve(op[4], var, index))
+
+                elif kind == "add":
+                    plan.add_value(lookup(refs, key, var), op[3],
+                                   resolve(op[4], var, index))
+
+                else:
+                    plan.add_shading_rule(
+                        lookup(refs, op[3], var),
+                        op[4].format(name=name, var=var, index=index),
+                        lookup(refs, op[5], var))
+
+        return plan
+
+
+# ------------------------------------------------------------------------------
+def load_template(template_p):
+    """
+    Returns the compiled template for a template file. Each template is only
+    compiled once, and compiled again only if its file is modified. Raises a
+    ValueError if the template is invalid.
+
+    :param template_p: The path to the template file.
+
+    :return: An AssetTemplate object.
+    """
+
+    try:
+        mtime = os.path.getmtime(template_p)
+    except OSError:
+        raise ValueError("Unable to read " + template_p)
+
+    with _templates_lock:
+        cached = _templates.get(template_p)
+        if cached is None or cached[1] != mtime:
+            cached = (AssetTemplate(template_p), mtime)
+            _templates[template_p] = cached
+
+        return cached[0]
@@ -0,0 +1,289 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import multiprocessing
+import os
+
+import projectgraph
+import scanner
+
+
+# ------------------------------------------------------------------------------
+def find_projects(paths):
+    """
+    Expands a list of projects and directories into a list of projects. Each
+    directory is searched recursively for .project files.
+
+    :param paths: A list of paths to projects and/or directories.
+
+    :return: A sorted list of absolute paths to projects, without duplicates.
+    """
+
+    projects = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for dir_d, dir_names, file_names in os.walk(path):
+                for file_name in file_names:
+                    if file_name.endswith(".project"):
+                        projects.add(os.path.join(dir_d, file_name))
+        elif path.endswith(".project"):
+            projects.add(path)
+
+    return sorted(projects)
+
+
+# ------------------------------------------------------------------------------
+def scan_project(project_p):
+    """
+    Parses a single project. Runs in a worker process, so it does both of the
+    slow parts of a scan: reading the project and testing every quoted string
+    against the file system. References are recognized the same way as in a
+    gather ($PDIR paths are resolved, and sequences are matched against a
+    listing of their directory).
+
+    :param project_p: The path to the project.
+
+    :return: A tuple of (the path to the project, a list of the files it
+             references that exist (as spelled in the project), a list of the
+             files it references that do not exist, an error message or None
+             if the project could be read).
+    """
+
+    found = list()
+    missing = list()
+    try:
+        quoted_strings = list(scanner.iter_quoted_strings(project_p))
+        resolved = scanner.resolve_pdir_paths(quoted_strings, project_p)
+        for quoted_string, resolved_p in zip(quoted_strings, resolved):
+            if scanner.is_reference(resolved_p):
+                found.append(quoted_string)
+            elif scanner.looks_like_file_path(resolved_p):
+                missing.append(resolved_p)
+    except (IOError, OSError) as e:
+        return project_p, list(), list(), str(e)
+
+    return project_p, found, missing, None
+
+
+# ==============================================================================
+class BulkScanReport(object):
+
+    """
+    The consolidated result of scanning many projects.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 graph):
+        """
+        Initialize the object.
+
+        :param graph: The ProjectGraph shared by every project that was scanned.
+
+        :return: Nothing.
+        """
+
+        self.graph = graph
+        self.referenced_by = dict()
+        self.missing = dict()
+        self.errors = dict()
+
+    # --------------------------------------------------------------------------
+    @property
+    def projects(self):
+        """
+        :return: A sorted list of every project that was scanned.
+        """
+
+        return sorted(self.graph.nodes)
+
+    # --------------------------------------------------------------------------
+    @property
+    def references(self):
+        """
+        :return: A sorted list of every existing non-project file referenced by
+                 any of the projects.
+        """
+
+        return sorted(file_p for file_p in self.referenced_by
+                      if file_p not in self.graph.nodes)
+
+    # --------------------------------------------------------------------------
+    def add_reference(self,
+                      file_p,
+                      project_p,
+                      missing=False):
+        """
+        Records that a project references a file.
+
+        :param file_p: The referenced file.
+        :param project_p: The project that references it.
+        :param missing: If True, the file does not exist. Defaults to False.
+
+        :return: Nothing.
+        """
+
+        if missing:
+            referencing = self.missing.setdefault(file_p, list())
+        else:
+            referencing = self.referenced_by.setdefault(file_p, list())
+        if project_p not in referencing:
+            referencing.append(project_p)
+
+    # --------------------------------------------------------------------------
+    def to_dict(self):
+        """
+        :return: The report as a dictionary of plain lists and dictionaries
+                 (suitable for json).
+        """
+
+        return {"projects": self.projects,
+                "references": self.references,
+                "referenced_by": dict((file_p, sorted(projects)) for
+                                      file_p, projects in
+                                      self.referenced_by.items()),
+                "missing": dict((file_p, sorted(projects)) for
+                                file_p, projects in self.missing.items()),
+                "cycles": [list(cycle) for cycle in self.graph.cycles],
+                "errors": self.errors}
+
+
+# ==============================================================================
+class BulkScanner(object):
+
+    """
+    Scans a large number of projects (a whole show, for example) using a pool
+    of processes. Every project, including every sub-project found along the
+    way, is parsed exactly once by one of the workers, and the results are
+    merged into a single ProjectGraph in the parent process.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 workers=None):
+        """
+        Initialize the object.
+
+        :param workers: The number of worker processes. If None, one per cpu.
+               Defaults to None.
+
+        :return: Nothing.
+        """
+
+        assert workers is None or (type(workers) is int and workers > 0)
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        self.workers = workers
+
+    # --------------------------------------------------------------------------
+    def _map(self,
+             pool,
+             projects):
+        """
+        Scans a batch of projects, in the pool if there is one.
+
+        :param pool: A multiprocessing pool, or None to scan in this process.
+        :param projects: The projects to scan.
+
+        :return: An iterator over the results of scan_project.
+        """
+
+        if pool is None:
+            return (scan_project(project_p) for project_p in projects)
+
+        # Large chunks keep the inter-process traffic down, while still leaving
+        # enough chunks to balance the load between the workers.
+        chunk_size = max(1, len(projects) // (self.workers * 4))
+        return pool.imap_unordered(scan_project, projects, chunk_size)
+
+    # --------------------------------------------------------------------------
+    def scan(self,
+             paths):
+        """
+        Scans projects and everything they reference.
+
+        :param paths: A list of paths to projects and/or directories (which are
+               searched recursively for projects).
+
+        :return: A BulkScanReport object.
+        """
+
+        graph = projectgraph.ProjectGraph()
+        report = BulkScanReport(graph)
+
+        # Every project is keyed by its absolute path, both here and in the
+        # graph, so that a project found by walking a directory is the same
+        # project as the one its parents reference.
+        parsed = dict()
+        graph.find_references = lambda project_p: parsed.pop(project_p)
+
+        pending = find_projects(paths)
+        queued = set(pending)
+
+        # A single root may turn out to have many sub-projects, so the pool
+        # does not depend on how many projects the first wave has.
+        pool = None
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers)
+
+        try:
+            # Sub-projects are only discovered as their parents are parsed, so
+            # scan in waves until no new projects turn up.
+            while pending:
+                next_pending = list()
+                for project_p, found, missing, error in self._map(pool,
+                                                                  pending):
+                    if error is not None:
+                        report.errors[project_p] = error
+
+                    parsed[project_p] = found
+                    node = graph.parse_project(project_p)
+
+                    for file_p in node.references:
+                        report.add_reference(file_p, project_p)
+                    for file_p in missing:
+                        report.add_reference(file_p, project_p, missing=True)
+
+                    for sub_project_p in node.sub_projects:
+                        sub_project_p = os.path.abspath(sub_project_p)
+                        if not os.path.isfile(sub_project_p):
+                            report.add_reference(sub_project_p, project_p,
+                                                 missing=True)
+                            continue
+                        report.add_reference(sub_project_p, project_p)
+                        if sub_project_p not in queued:
+                            queued.add(sub_project_p)
+                            next_pending.append(sub_project_p)
+
+                pending = next_pending
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        graph.update_cycles()
+
+        return report
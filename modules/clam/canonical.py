@@ -0,0 +1,132 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+
+
+# ==============================================================================
+class CanonicalFiles(object):
+
+    """
+    Groups paths by the physical file they lead to. The same file is often
+    referenced through several spellings (a symlink, a hard link, a $PDIR path
+    that resolves to somewhere another project references absolutely). Each
+    physical file is identified by its device and inode, and every spelling of
+    it is mapped to a single canonical path: the first spelling that was added.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 stat_cache=None):
+        """
+        Initialize the object.
+
+        :param stat_cache: An optional StatCache used to stat each path, so that
+               paths already stat'ed during a gather are not stat'ed again. If
+               None, os.stat is used. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        self.stat_cache = stat_cache
+        self.canonical = dict()
+        self.files = list()
+        self._by_identity = dict()
+
+    # --------------------------------------------------------------------------
+    def _identity(self,
+                  path):
+        """
+        :param path: The path to identify.
+
+        :return: A hashable identity of the physical file at path. The device
+                 and inode if the file exists, otherwise the resolved path.
+        """
+
+        if self.stat_cache is None:
+            try:
+                result = os.stat(path)
+            except (OSError, ValueError):
+                result = None
+        else:
+            result = self.stat_cache.stat(path)
+
+        if result is None or not result.st_ino:
+            return os.path.realpath(path)
+
+        return result.st_dev, result.st_ino
+
+    # --------------------------------------------------------------------------
+    def add(self,
+            path):
+        """
+        Adds a path.
+
+        :param path: The path to add.
+
+        :return: The canonical path of the file.
+        """
+
+        if path in self.canonical:
+            return self.canonical[path]
+
+        identity = self._identity(path)
+        canonical_p = self._by_identity.get(identity)
+        if canonical_p is None:
+            canonical_p = path
+            self._by_identity[identity] = path
+            self.files.append(path)
+
+        self.canonical[path] = canonical_p
+
+        return canonical_p
+
+    # --------------------------------------------------------------------------
+    @property
+    def duplicates(self):
+        """
+        :return: The number of paths that lead to a file that was already added
+                 under another spelling.
+        """
+
+        return len(self.canonical) - len(self.files)
+
+    # --------------------------------------------------------------------------
+    def expand(self,
+               remapped):
+        """
+        Extends a dictionary keyed on canonical paths so that every spelling of
+        each file maps to the same value.
+
+        :param remapped: A dictionary whose keys are canonical paths.
+
+        :return: A new dictionary with a key for every spelling of every file in
+                 remapped.
+        """
+
+        output = dict(remapped)
+        for path, canonical_p in self.canonical.items():
+            if canonical_p in remapped:
+                output[path] = remapped[canonical_p]
+
+        return output
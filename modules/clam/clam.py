@@ -22,11 +22,14 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
-import inspect
 import os.path
-import re
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 import shutil
 import tempfile
+import threading
 
 try:
     import ix
@@ -36,13 +39,49 @@ except ImportError:
 from bvzlib import config
 from bvzlib import resources
 
-from libClarisse import libClarisse
-
-from squirrel.gather import gather
-from squirrel.librarian import librarian
 from squirrel.shared.squirrelerror import SquirrelError
 
+import assetbuilder
+import assettemplate
+import canonical
 from clamerror import ClamError
+import projectgraph
+import publisher
+import remapper
+import renamer
+import repomembership
+import scanner
+import sequences
+import statcache
+
+# libClarisse, squirrel's gather and librarian, the reference index (sqlite),
+# the copier and manifest (hashlib, json) and the thread pools are slow to
+# import and only needed by some operations, so they are imported where they
+# are first used. That keeps shelf tools that only validate names (and every
+# reload of clam) quick.
+
+
+MODULE_D = os.path.dirname(os.path.abspath(__file__))
+RESOURCES_D = os.path.abspath(os.path.join(MODULE_D, "..", "..", "resources"))
+CONFIG_P = os.path.abspath(os.path.join(MODULE_D, "..", "..", "config",
+                                        "clam.config"))
+CONFIG_ENV_VAR = "CLAM_CONFIG_PATH"
+
+# Settings that are optional in the config (so that site configs written before
+# they existed remain valid), and the values used when they are not set.
+SETTING_DEFAULTS = {"trust_gather_manifest": "False",
+                    "ref_cache_d": "",
+                    "ref_cache_max_entries": "100000",
+                    "ref_cache_hash": "False",
+                    "stat_workers": "0",
+                    "copy_workers": "4",
+                    "copy_retries": "3",
+                    "link_mode": "copy"}
+ASSET_TEMPLATE_P = os.path.abspath(os.path.join(MODULE_D, "..", "..", "config",
+                                                "asset_template.config"))
+
+_clam_objs = dict()
+_clam_objs_lock = threading.Lock()
 
 
 # ==============================================================================
@@ -67,32 +106,140 @@ class Clam(object):
 
         self.language = language
 
-        module_d = os.path.split(inspect.stack()[0][1])[0]
-        resources_d = os.path.join(module_d, "..", "..", "resources")
-        resources_d = os.path.abspath(resources_d)
-        self.resc = resources.Resources(resources_d, "lib_clam", language)
+        self.resc = resources.Resources(RESOURCES_D, "lib_clam", language)
+
+        self.config_p = CONFIG_P
+        self.load_config()
+
+        self.stat_cache = None
+
+        # The librarian session is shared by every operation, and is only
+        # created (and each part initialized) the first time it is needed.
+        self._librarian = None
+        self._librarian_parts = set()
+        self._librarian_lock = threading.RLock()
 
-        config_d = os.path.join(module_d, "..", "..", "config")
-        config_d = os.path.abspath(config_d)
-        self.config_p = os.path.join(config_d, "clam.config")
-        self.config_obj = config.Config(self.config_p, "CLAM_CONFIG_PATH")
+        self.invalid_asset_names = dict()
+        self._name_errors = dict()
+
+        self.repo_membership = repomembership.RepoMembership()
+
+    # --------------------------------------------------------------------------
+    def load_config(self):
+        """
+        Reads (or re-reads) the clam config and applies its settings.
+
+        :return: Nothing.
+        """
+
+        self.config_obj = config.Config(self.config_p, CONFIG_ENV_VAR)
 
         self.validate_config()
 
+        for setting in SETTING_DEFAULTS:
+            if not self.config_obj.has_option("settings", setting):
+                self.config_obj.set("settings", setting,
+                                    SETTING_DEFAULTS[setting])
+
         self.do_verified_copy = self.config_obj.getboolean("settings",
                                                            "do_verified_copy")
+        self.trust_gather_manifest = self.config_obj.getboolean(
+            "settings", "trust_gather_manifest")
+
+        self.ref_index = None
+        ref_cache_d = self.config_obj.get("settings", "ref_cache_d")
+        if ref_cache_d:
+            import refindex
+            ref_cache_d = os.path.expanduser(os.path.expandvars(ref_cache_d))
+            self.ref_index = refindex.RefIndex(
+                cache_d=ref_cache_d,
+                max_entries=self.config_obj.getint("settings",
+                                                   "ref_cache_max_entries"),
+                use_hash=self.config_obj.getboolean("settings",
+                                                    "ref_cache_hash"))
+
+        self.stat_workers = self.config_obj.getint("settings", "stat_workers")
+
+        self.copy_workers = self.config_obj.getint("settings", "copy_workers")
+        self.copy_retries = self.config_obj.getint("settings", "copy_retries")
+        self.link_mode = self.config_obj.get("settings", "link_mode")
+        self.validate_link_mode(self.link_mode)
 
-        self.librarian = librarian.Librarian(init_name=False,
-                                             init_schema=False,
-                                             init_store=False,
-                                             language=language)
+    # --------------------------------------------------------------------------
+    def get_librarian(self,
+                      name=False,
+                      schema=False,
+                      store=False):
+        """
+        Returns the librarian session shared by every operation, creating it if
+        needed. Each part of the librarian (name, schema and store) is only
+        initialized the first time it is asked for, so repeated operations do
+        not pay for loading the same config and schema again. Safe to call from
+        any thread.
+
+        :param name: If True, the librarian's name validation is initialized.
+               Defaults to False.
+        :param schema: If True, the librarian's schema is initialized. Defaults
+               to False.
+        :param store: If True, the librarian's store is initialized. Defaults to
+               False.
+
+        :return: The librarian object.
+        """
 
-        self.invalid_asset_names = dict()
+        with self._librarian_lock:
+
+            if self._librarian is None:
+                from squirrel.librarian import librarian
+                self._librarian = librarian.Librarian(init_name=False,
+                                                      init_schema=False,
+                                                      init_store=False,
+                                                      language=self.language)
+                self._librarian_parts = set()
+
+            if name and "name" not in self._librarian_parts:
+                self._librarian.init_name()
+                self._librarian_parts.add("name")
+            if schema and "schema" not in self._librarian_parts:
+                self._librarian.init_schema()
+                self._librarian_parts.add("schema")
+            if store and "store" not in self._librarian_parts:
+                self._librarian.init_store()
+                self._librarian_parts.add("store")
+
+            return self._librarian
+
+    # --------------------------------------------------------------------------
+    @property
+    def librarian(self):
+        """
+        :return: The shared librarian session (see get_librarian), without
+                 initializing anything that has not been initialized yet.
+        """
+
+        return self.get_librarian()
+
+    # --------------------------------------------------------------------------
+    def invalidate_librarian(self):
+        """
+        Throws away the shared librarian session (and everything cached from
+        it), so that the next operation starts a fresh one. Call this after the
+        squirrel config, schema or repos have changed on disk.
+
+        :return: Nothing.
+        """
+
+        with self._librarian_lock:
+            self._librarian = None
+            self._librarian_parts = set()
+            self._name_errors = dict()
+            self.repo_membership.clear()
 
     # --------------------------------------------------------------------------
     def validate_config(self):
         """
         Makes sure the config file is valid. Raises a squirrel error if not.
+        Settings in SETTING_DEFAULTS are optional.
 
         :return: Nothing.
         """
@@ -114,6 +261,25 @@ class Clam(object):
                                          section=failures[0])
                 raise ClamError(err.msg, err.code)
 
+    # --------------------------------------------------------------------------
+    def validate_link_mode(self,
+                           link_mode):
+        """
+        Makes sure a link mode is one that the copier understands. Raises a
+        clam error if not.
+
+        :param link_mode: The link mode to test.
+
+        :return: Nothing.
+        """
+
+        import copier
+        if link_mode not in copier.LINK_MODES:
+            err = self.resc.error(107)
+            err.msg = err.msg.format(link_mode=link_mode,
+                                     link_modes=", ".join(copier.LINK_MODES))
+            raise ClamError(err.msg, err.code)
+
     # --------------------------------------------------------------------------
     @staticmethod
     def find_all_file_references_in_project(project_p):
@@ -121,38 +287,59 @@ class Clam(object):
         Given a path to a clarisse project, open that project's text file and
         extract all of the references to any external files. We do this via a
         text file vs. built in clarisse api functions because it is MUCH easier
-        this way (even if it is a bit janky).
-
+        this way (even if it is a bit janky). The project is streamed rather
+        than read into memory, so very large projects are cheap to scan.
 
         :param project_p: The path to the project we are testing.
 
         :return: A list of all the files referenced in this project.
         """
 
-        assert os.path.exists(project_p)
-        assert os.path.isfile(project_p)
-        assert os.path.splitext(project_p)[1] == ".project"
+        return list(scanner.iter_file_references(project_p))
 
-        files = list()
+    # --------------------------------------------------------------------------
+    def file_references_in_project(self,
+                                   project_p):
+        """
+        Given a path to a clarisse project, return all of the references to any
+        external files. If a reference cache directory is set in the config,
+        the quoted strings in the project are taken from the persistent
+        reference index whenever the project has not changed since it was last
+        scanned. During a gather, each candidate file is only stat'ed once (see
+        start_stat_session). References are returned as they are spelled in
+        the project, so $PDIR references are returned unresolved (but only if
+        they resolve to a file that exists). A path with a frame or tile token
+        (<UDIM>, #### or $F4) is returned as a single reference if any file
+        matches it. Matching lists each directory once (see
+        sequences.find_sequence) rather than testing every frame.
 
-        file_pattern = r'"(?:[^"\\]|\\.)*"'
+        :param project_p: The path to the project we are testing.
 
-        with open(project_p, "r") as f:
-            lines = f.readlines()
+        :return: A list of all the files referenced in this project.
+        """
+
+        if self.ref_index is None:
+            quoted_strings = scanner.iter_quoted_strings(project_p)
+        else:
+            quoted_strings = self.ref_index.quoted_strings(
+                project_p, scanner.iter_quoted_strings)
 
-        for line in lines:
-            if line.strip().lower().startswith("#preferences"):
-                break
+        quoted_strings = list(quoted_strings)
+        resolved = scanner.resolve_pdir_paths(quoted_strings, project_p)
 
-            # Check to see if the current line looks like a file pattern
-            potential_files = re.findall(file_pattern, line)
-            if potential_files:
-                for file_name in potential_files:
-                    file_name = file_name.strip('"')
-                    if os.path.exists(file_name) and os.path.isfile(file_name):
-                        files.append(file_name)
+        # Another thread may end the stat session while we are working
+        stat_cache = self.stat_cache
+
+        if stat_cache is None:
+            is_file = os.path.isfile
+            listdir = None
+        else:
+            stat_cache.prefetch(resolved)
+            is_file = stat_cache.is_file
+            listdir = stat_cache.listdir
 
-        return files
+        return [file_p for file_p, resolved_p in zip(quoted_strings, resolved)
+                if scanner.is_reference(resolved_p, is_file, listdir)]
 
     # --------------------------------------------------------------------------
     def refs_in_project(self,
@@ -174,7 +361,7 @@ class Clam(object):
 
         output = list()
 
-        all_files_p = self.find_all_file_references_in_project(project_p)
+        all_files_p = self.file_references_in_project(project_p)
 
         if all_files_p:
 
@@ -184,6 +371,26 @@ class Clam(object):
 
         return output
 
+    # --------------------------------------------------------------------------
+    def project_graph(self,
+                      project_p):
+        """
+        Given a path to a clarisse project, build the dependency graph of that
+        project and every project it references (recursively). Each project is
+        only ever parsed once, and cycles are recorded in the graph's cycles
+        attribute instead of being followed.
+
+        :param project_p: The path to the project we are testing.
+
+        :return: A ProjectGraph object.
+        """
+
+        graph = projectgraph.ProjectGraph(self.file_references_in_project,
+                                          self.resc)
+        graph.add_project(project_p)
+
+        return graph
+
     # --------------------------------------------------------------------------
     def sub_projects_in_project_recursive(self,
                                           project_p):
@@ -202,25 +409,9 @@ class Clam(object):
         assert os.path.isfile(project_p)
         assert os.path.splitext(project_p)[1] == ".project"
 
-        output = list()
-        sub_projects = list()
-
-        all_files_p = self.find_all_file_references_in_project(project_p)
-
-        if all_files_p:
-
-            for file_p in all_files_p:
-                if file_p.endswith(".project"):
-                    sub_projects.append(file_p)
-
-        if sub_projects:
-            for sub_project in sub_projects:
-                sub_project = libClarisse.pdir_to_path(sub_project, project_p)
-                output.append(sub_project)
-                output.extend(
-                    self.sub_projects_in_project_recursive(sub_project))
+        graph = self.project_graph(project_p)
 
-        return output
+        return graph.sub_projects(project_p)
 
     # --------------------------------------------------------------------------
     def all_refs_in_project_recursive(self,
@@ -237,25 +428,22 @@ class Clam(object):
                  non-project files referenced in any of these projects.
         """
 
-        projects = self.sub_projects_in_project_recursive(project_p)
-        projects = list(set(projects))
-
-        references = self.refs_in_project(project_p)
-        for sub_project_p in projects:
-            references.extend(self.refs_in_project(sub_project_p))
-        references = list(set(references))
+        graph = self.project_graph(project_p)
 
-        return projects, references
+        return graph.sub_projects(project_p), graph.references(project_p)
 
     # --------------------------------------------------------------------------
     @staticmethod
     def munge_project(project_p,
                       remapped,
-                      relative=True):
+                      relative=True,
+                      pattern=None,
+                      local_remapped=None):
         """
         Given a project, opens that project and does a text replace on any files
         to point to the new location. If relative is True, then the path will be
-        converted to a relative path from source_p.
+        converted to a relative path from source_p. All of the remapped paths
+        are matched in a single pass over each line, longest path first.
 
         :param project_p: The path to the project we are munging.
         :param remapped: The dictionary where the key is the original path that
@@ -263,8 +451,16 @@ class Clam(object):
                where this file has been gathered to.
         :param relative: If True, then the munged path will be made relative to
                project we are munging. Defaults to True.
-
-        :return: Nothing.
+        :param pattern: The compiled matcher for the keys of remapped (see
+               remapper.build_pattern), so that munging several projects with
+               the same remapped dictionary only compiles it once. If None, it
+               will be built here. Defaults to None.
+        :param local_remapped: An optional dictionary like remapped for paths
+               that are only found in this project (i.e. its $PDIR paths). See
+               remapper.PathRewriter. Defaults to None.
+
+        :return: True if the project was rewritten, False if it did not contain
+                 any remapped paths (in which case it is left untouched).
         """
 
         assert os.path.exists(project_p)
@@ -273,28 +469,145 @@ class Clam(object):
         assert type(remapped) is dict
         assert type(relative) is bool
 
-        project_parent_d = os.path.split(project_p)[0]
-
-        munged_p = project_p + ".out"
+        rewriter = remapper.PathRewriter(remapped, project_p, relative, pattern,
+                                         local_remapped)
 
+        # Cheap pre-scan: leave projects that need no substitutions untouched
         with open(project_p, "r") as source_project_f:
-            with open(munged_p, "w") as munged_project_f:
-                line = source_project_f.readline()
-                while line:
-                    for key in remapped:
-                        if key in line:
-                            if relative:
-                                rel_path = os.path.relpath(remapped[key],
-                                                           project_parent_d)
-                                rel_path = os.path.join("$PDIR", rel_path)
-                                line = line.replace(key, rel_path)
-                            else:
-                                line = line.replace(key, remapped[key])
-                    munged_project_f.write(line)
-                    line = source_project_f.readline()
-
-        shutil.copyfile(munged_p, project_p)
-        os.remove(munged_p)
+            for line in source_project_f:
+                if rewriter.matches(line):
+                    break
+            else:
+                return False
+
+        # Write to a temp file next to the project, then rename it over the
+        # original. The rename is atomic, so a crash can never leave a half
+        # written project behind.
+        project_d, project_n = os.path.split(project_p)
+        munged_fd, munged_p = tempfile.mkstemp(prefix=project_n + ".",
+                                               suffix=".out",
+                                               dir=project_d)
+        try:
+            with os.fdopen(munged_fd, "w") as munged_project_f:
+                with open(project_p, "r") as source_project_f:
+                    for line in source_project_f:
+                        munged_project_f.write(rewriter.rewrite(line))
+            shutil.copymode(project_p, munged_p)
+            os.rename(munged_p, project_p)
+        except BaseException:
+            if os.path.exists(munged_p):
+                os.remove(munged_p)
+            raise
+
+        return True
+
+    # --------------------------------------------------------------------------
+    def start_stat_session(self):
+        """
+        Starts memoizing file existence checks so that every candidate file is
+        only stat'ed once for the duration of a gather or publish operation. If
+        a session is already running, it is reused.
+
+        :return: True if this call started a new session (and is therefore
+                 responsible for ending it), False otherwise.
+        """
+
+        if self.stat_cache is not None:
+            return False
+
+        self.stat_cache = statcache.StatCache(self.stat_workers)
+        return True
+
+    # --------------------------------------------------------------------------
+    def end_stat_session(self,
+                         verbose=False):
+        """
+        Stops memoizing file existence checks and throws away the memoized
+        results.
+
+        :param verbose: If True, then the number of stats issued and the time
+               they took will be printed to stdOut.
+
+        :return: Nothing.
+        """
+
+        stat_cache = self.stat_cache
+        if stat_cache is None:
+            return
+
+        self.stat_cache = None
+
+        if verbose:
+            msg = self.resc.message("stat_report")
+            print(msg.format(count=stat_cache.stat_count,
+                             listings=stat_cache.listdir_count,
+                             seconds=stat_cache.stat_time))
+
+    # --------------------------------------------------------------------------
+    def copy_files(self,
+                   remapped,
+                   verbose=False,
+                   link_mode=None,
+                   hash_files=False,
+                   check_size=False,
+                   callback=None):
+        """
+        Copies files to their gathered location using a pool of copy_workers
+        threads (set in the config), largest files first, retrying copies that
+        fail with a transient error.
+
+        :param remapped: The dictionary where the key is the original path of a
+               file, and the value is the path it should be copied to.
+        :param verbose: If True, then each copy operation and the overall
+               throughput will be printed to stdOut.
+        :param link_mode: How the files are placed at their new location:
+               "copy", "hardlink", "reflink" or "symlink". Links that are not
+               possible (i.e. across devices) fall back to copies. If None, the
+               link_mode set in the config is used. Defaults to None.
+        :param hash_files: If True, each file is hashed as it is copied (in the
+               same pass that reads it). Defaults to False.
+        :param check_size: If True, the size of each copy is checked against
+               its source, and the file re-copied if they differ. This does not
+               check the contents (see verify_stored_copy). Defaults to False.
+        :param callback: An optional function called (on the calling thread)
+               with the source and destination path of each file as soon as it
+               has been copied, while other copies are still running. Defaults
+               to None.
+
+        :return: The Copier object that did the work. Its stats attribute
+                 describes the copies, and its hashes attribute holds the hash
+                 of each source file (if hash_files is True).
+        """
+
+        if link_mode is None:
+            link_mode = self.link_mode
+        self.validate_link_mode(link_mode)
+
+        import copier
+        copier_obj = copier.Copier(workers=self.copy_workers,
+                                   retries=self.copy_retries,
+                                   link_mode=link_mode,
+                                   hash_files=hash_files,
+                                   check_size=check_size)
+
+        copy_msg = self.resc.message("copy_file")
+
+        def copied(source_p, dest_p):
+            if verbose:
+                print(copy_msg.format(source=source_p, dest=dest_p))
+            if callback:
+                callback(source_p, dest_p)
+
+        stats = copier_obj.copy_files(remapped, copied)
+
+        if verbose:
+            msg = self.resc.message("copy_report")
+            print(msg.format(files=stats.files,
+                             megabytes=stats.bytes / (1024.0 * 1024.0),
+                             seconds=stats.seconds,
+                             throughput=stats.throughput / (1024.0 * 1024.0)))
+
+        return copier_obj
 
     # --------------------------------------------------------------------------
     def gather_project(self,
@@ -302,13 +615,21 @@ class Clam(object):
                        dest,
                        skip_published=False,
                        repos=None,
-                       verbose=False):
+                       verbose=False,
+                       incremental=False,
+                       use_hash=False,
+                       link_mode=None,
+                       verify_copy=False):
         """
         Given a path to a clarisse project, open that project and recursively
         gather all the files referenced in this project or any of its
         references. We do this via a text file vs. built in clarisse api
         functions because it is MUCH easier this way (even if it is a bit
-        janky).
+        janky). A file referenced through several spellings (symlinks, hard
+        links, $PDIR paths) is only gathered once, and every spelling is
+        rewritten to point to that one copy. A reference to a sequence of
+        files (<UDIM>, #### or $F4) gathers every file in the sequence into a
+        single directory, and is rewritten as a single path.
 
         :param project_p: The path to the project we are gathering.
         :param dest: The destination where the context should be gathered to.
@@ -319,6 +640,22 @@ class Clam(object):
                Defaults to None.
         :param verbose: If True, then the copy operations will be printed to
                stdOut.
+        :param incremental: If True, then any file that an earlier gather
+               already placed into dest with the same link_mode, and whose
+               source has not changed since, will not be copied again. Project
+               files are always copied and munged. Defaults to False.
+        :param use_hash: If True (and incremental is True), then a source file
+               is only considered unchanged if its contents still hash to the
+               value recorded by the earlier gather. Defaults to False.
+        :param link_mode: "copy", "hardlink", "reflink" or "symlink" (useful
+               for quick preview gathers). Falls back to copying wherever a
+               link is not possible. If None, the link_mode set in the config is
+               used. Defaults to None.
+        :param verify_copy: If True, every file is hashed while it is copied,
+               the size of each copy is checked, and the hashes are recorded
+               in the gather manifest so that a copy of the gather can be
+               checked against them later (see verify_stored_copy). Defaults
+               to False.
 
         :return: The directory into which the project is gathered.
         """
@@ -334,66 +671,214 @@ class Clam(object):
             for repo in repos:
                 assert type(repo) is str
 
-        # Get every file (recursively) referenced in this project
-        all_files = list()
-        projects, refs = self.all_refs_in_project_recursive(project_p)
-        all_files.extend(projects)
-        all_files.extend(refs)
-        all_files.append(project_p)
-
-        # Create a gather object and remap the files
-        gather_obj = gather.Gather(self.language)
-        gather_obj.set_attributes(
-            files=all_files,
-            dest=dest,
-            mapping=None,
-            padding=None,
-            udim_identifier="<UDIM>",
-            strict_udim_format=True,
-            match_hash_length=False)
-        gather_obj.remap_files()
-
-        # If skip_published, remove any files that are already published
-        if skip_published:
-
-            if not repos:
-                repo_names = None
-                check_all_repos = True
-            else:
-                repo_names = repos
-                check_all_repos = False
+        # Projects are keyed in the project graph by their absolute path
+        project_p = os.path.abspath(project_p)
 
-            librarian_obj = librarian.Librarian(init_name=False,
-                                                init_schema=True,
-                                                init_store=True,
-                                                language=self.language)
+        owns_stat_session = self.start_stat_session()
+        try:
+            # Get every file (recursively) referenced in this project
+            all_files = list()
+            graph = self.project_graph(project_p)
+            all_files.extend(graph.sub_projects(project_p))
+            all_files.extend(graph.references(project_p))
+            all_files.append(project_p)
+
+            # The same physical file may be referenced through several
+            # spellings (symlinks, hard links, $PDIR paths). Only gather one of
+            # them, and point every spelling at that one copy.
+            canonical_obj = canonical.CanonicalFiles(self.stat_cache)
+            for file_p in all_files:
+                canonical_obj.add(file_p)
+
+            if verbose and canonical_obj.duplicates:
+                msg = self.resc.message("duplicate_report")
+                print(msg.format(count=canonical_obj.duplicates,
+                                 files=len(canonical_obj.files)))
+
+            # A sequence (<UDIM>, ####, $F4) is gathered as a single unit. Only
+            # its first file is remapped, and every other file in the sequence
+            # follows it into the same directory.
+            stat_cache = self.stat_cache
+            listdir = stat_cache.listdir if stat_cache is not None else None
+
+            files = list()
+            file_sequences = dict()
+            for file_p in canonical_obj.files:
+                file_sequence = None
+                if sequences.has_token(file_p):
+                    file_sequence = sequences.find_sequence(file_p, listdir)
+                if file_sequence is None:
+                    files.append(file_p)
+                else:
+                    file_sequences[file_p] = file_sequence
+
+            plain_files = set(files)
+            for file_sequence in file_sequences.values():
+                first_p = file_sequence.path(file_sequence.frames[0])
+                if first_p not in plain_files:
+                    files.append(first_p)
+
+            if verbose and file_sequences:
+                msg = self.resc.message("sequence_report")
+                print(msg.format(count=len(file_sequences),
+                                 files=sum(len(file_sequence) for
+                                           file_sequence in
+                                           file_sequences.values())))
+
+            # Create a gather object and remap the files
+            from squirrel.gather import gather
+            gather_obj = gather.Gather(self.language)
+            gather_obj.set_attributes(
+                files=files,
+                dest=dest,
+                mapping=None,
+                padding=None,
+                udim_identifier="<UDIM>",
+                strict_udim_format=True,
+                match_hash_length=False)
+            gather_obj.remap_files()
+
+            # If skip_published, remove any files that are already published.
+            # Repo membership is cached per directory across gathers.
+            if skip_published:
+
+                librarian_obj = self.get_librarian(schema=True, store=True)
+
+                files_to_cull = self.repo_membership.files_within_repos(
+                    list(gather_obj.remapped), librarian_obj, repos)
+
+                for file_to_cull in files_to_cull:
+                    gather_obj.cull_file(file_to_cull)
+
+            # Place each sequence where its first file was remapped to, named
+            # after it (so a first file renamed to avoid a clash renames the
+            # whole sequence). A sequence whose first file was culled is not
+            # gathered.
+            dest_sequences = dict()
+            first_files = set()
+            for sequence_p, file_sequence in sorted(file_sequences.items()):
+                first_p = file_sequence.path(file_sequence.frames[0])
+                if first_p not in gather_obj.remapped:
+                    continue
+                try:
+                    dest_sequences[sequence_p] = file_sequence.moved(
+                        gather_obj.remapped[first_p])
+                except ValueError:
+                    err = self.resc.error(110)
+                    err.msg = err.msg.format(
+                        sequence=sequence_p, dest=gather_obj.remapped[first_p])
+                    raise ClamError(err.msg, err.code)
+                first_files.add(first_p)
+
+            for first_p in first_files - plain_files:
+                gather_obj.cull_file(first_p)
+
+            # The other files of a sequence were not remapped by the gather,
+            # so make sure none of them lands on a file gathered from
+            # somewhere else.
+            gathered_from = dict((dest_p, source_p) for source_p, dest_p in
+                                 gather_obj.remapped.items())
+            for sequence_p in sorted(dest_sequences):
+                for source_p, dest_p in zip(file_sequences[sequence_p].paths(),
+                                            dest_sequences[sequence_p].paths()):
+                    other_p = gathered_from.setdefault(dest_p, source_p)
+                    if other_p != source_p:
+                        err = self.resc.error(111)
+                        err.msg = err.msg.format(sequence=sequence_p,
+                                                 dest=dest_p,
+                                                 other=other_p)
+                        raise ClamError(err.msg, err.code)
+
+            # Skip any files an earlier gather already placed the same way
+            # (unchanged)
+            if link_mode is None:
+                link_mode = self.link_mode
+
+            import manifest
+            gather_manifest = manifest.Manifest(dest)
+            to_copy = dict()
+
+            def add_copy(source_p, dest_p):
+                if (incremental and
+                        not dest_p.endswith(".project") and
+                        gather_manifest.is_current(source_p, dest_p, use_hash,
+                                                   link_mode)):
+                    return
+                to_copy[source_p] = dest_p
 
-            files_to_cull = list()
             for source_p in gather_obj.remapped:
-                if librarian_obj.file_is_within_repo(source_p,
-                                                     repo_names,
-                                                     check_all_repos):
-                    files_to_cull.append(source_p)
-
-            for file_to_cull in files_to_cull:
-                gather_obj.cull_file(file_to_cull)
-
-        # Actually copy the files to their remap location
-        gather_obj.copy_files(verbose=verbose)
-
-        copied_files_p = list()
-        for file_p in gather_obj.remapped:
-            copied_files_p.append(gather_obj.remapped[file_p])
-
-        for file_p in copied_files_p:
-            if file_p.endswith(".project"):
-                self.munge_project(file_p, gather_obj.remapped, True)
+                add_copy(source_p, gather_obj.remapped[source_p])
+
+            for sequence_p in dest_sequences:
+                for source_p, dest_p in zip(file_sequences[sequence_p].paths(),
+                                            dest_sequences[sequence_p].paths()):
+                    add_copy(source_p, dest_p)
+
+            # Every spelling of every gathered file (or sequence), mapped to its
+            # one copy. A sequence is munged as a single path, token and all.
+            remapped = dict(gather_obj.remapped)
+            for sequence_p in dest_sequences:
+                remapped[sequence_p] = dest_sequences[sequence_p].pattern
+            remapped = canonical_obj.expand(remapped)
+
+            # The $PDIR spellings in each project (relative to that project,
+            # so they cannot be shared with the other projects).
+            pdir_remapped = dict()
+            for node_p, node in graph.nodes.items():
+                project_remapped = pdir_remapped.setdefault(
+                    canonical_obj.canonical.get(node_p, node_p), dict())
+                for file_p, spellings in node.spellings.items():
+                    if file_p in remapped:
+                        for spelling in spellings:
+                            project_remapped[spelling] = remapped[file_p]
+
+            # Munge each project as soon as it has been copied, while the
+            # remaining files are still being copied.
+            pattern = remapper.build_pattern(remapped)
+            munged_hashes = dict()
+            hash_files = use_hash or verify_copy
+
+            def munge_copied(source_p, dest_p):
+                if dest_p.endswith(".project"):
+                    self.munge_project(dest_p, remapped, True, pattern,
+                                       pdir_remapped.get(source_p))
+                    # The gathered project no longer matches its source
+                    if hash_files:
+                        munged_hashes[source_p] = manifest.hash_file(dest_p)
+
+            # Actually copy the files to their remap location
+            copier_obj = self.copy_files(remapped=to_copy,
+                                         verbose=verbose,
+                                         link_mode=link_mode,
+                                         hash_files=hash_files,
+                                         check_size=verify_copy,
+                                         callback=munge_copied)
+
+            # The manifest lists the artist's source paths, so it is only
+            # written where a later incremental gather or a verified publish
+            # needs it (or to keep an existing one up to date).
+            if (incremental or
+                    verify_copy or
+                    os.path.exists(gather_manifest.manifest_p)):
+                for source_p in to_copy:
+                    file_hash = munged_hashes.get(
+                        source_p, copier_obj.hashes.get(source_p))
+                    gather_manifest.record(source_p, to_copy[source_p],
+                                           file_hash, link_mode)
+
+                gather_manifest.save()
+        finally:
+            if owns_stat_session:
+                self.end_stat_session(verbose)
 
     # --------------------------------------------------------------------------
     def gather_context(self,
                        context,
                        dest,
-                       verbose=False):
+                       verbose=False,
+                       incremental=False,
+                       link_mode=None,
+                       verify_copy=False):
         """
         Given a context, gather all of the files in it (and any referenced
         contexts).
@@ -405,6 +890,14 @@ class Clam(object):
                a sub-dir inside this dir that is named the same as the context).
         :param verbose: If True, then the copy operations will be printed to
                stdOut.
+        :param incremental: If True, then files that an earlier gather of this
+               context already copied (and that have not changed since) will
+               not be copied again. Defaults to False.
+        :param link_mode: "copy", "hardlink", "reflink" or "symlink". If None,
+               the link_mode set in the config is used. Defaults to None.
+        :param verify_copy: If True, files are hashed as they are copied and
+               the hashes are recorded in the gather manifest (see
+               gather_project). Defaults to False.
 
         :return: The directory where the context was gathered. I.e. the sub-dir
                  of dest that is the gathered context.
@@ -414,30 +907,93 @@ class Clam(object):
         assert(os.path.exists(dest))
         assert(os.path.isdir(dest))
 
+        exported_p = self.export_context(context)
+
+        return self.gather_exported_context(exported_p=exported_p,
+                                            name=context.get_name(),
+                                            dest=dest,
+                                            verbose=verbose,
+                                            incremental=incremental,
+                                            link_mode=link_mode,
+                                            verify_copy=verify_copy)
+
+    # --------------------------------------------------------------------------
+    def export_context(self,
+                       context):
+        """
+        Exports a context (and its dependencies) to a temporary project. This is
+        the only part of a gather that talks to clarisse, so it must be called
+        from the thread that owns the clarisse api. Everything that happens to
+        the exported project afterwards can run anywhere.
+
+        :param context: The context to export. Must be atomic.
+
+        :return: The path to the exported project.
+        """
+
+        from libClarisse import libClarisse
+
         if not libClarisse.contexts_are_atomic(context):
             err = self.resc.error(102)
             err.msg = err.msg.format(context=context.get_name())
             raise ClamError(err.msg, err.code)
 
-        # Create a temporary, exported project
         temp_project_dir = tempfile.mkdtemp(prefix="temp_project_")
-        exported_p = libClarisse.export_context_with_deps(context,
-                                                          temp_project_dir,
-                                                          True)
-        dest = os.path.join(dest, context.get_name())
+        return libClarisse.export_context_with_deps(context,
+                                                    temp_project_dir,
+                                                    True)
+
+    # --------------------------------------------------------------------------
+    def gather_exported_context(self,
+                                exported_p,
+                                name,
+                                dest,
+                                verbose=False,
+                                incremental=False,
+                                link_mode=None,
+                                verify_copy=False,
+                                remove_exported=True):
+        """
+        Gathers a context that has already been exported (see export_context)
+        into a sub-dir of dest named after the context, then removes the
+        exported project. Does not touch clarisse.
+
+        :param exported_p: The path to the exported project.
+        :param name: The name of the context.
+        :param dest: The directory inside of which the context's gather
+               directory will be created.
+        :param verbose: If True, then the copy operations will be printed to
+               stdOut.
+        :param incremental: See gather_project. Defaults to False.
+        :param link_mode: See gather_project. Defaults to None.
+        :param verify_copy: See gather_project. Defaults to False.
+        :param remove_exported: If True, the exported project is deleted once it
+               has been gathered. Pass False to gather a project that was not
+               exported for this purpose. Defaults to True.
+
+        :return: The directory where the context was gathered.
+        """
+
+        dest = os.path.join(dest, name)
         if not os.path.exists(dest):
             os.mkdir(dest)
         self.gather_project(project_p=exported_p,
                             dest=dest,
-                            verbose=verbose)
-        os.remove(exported_p)
+                            verbose=verbose,
+                            incremental=incremental,
+                            link_mode=link_mode,
+                            verify_copy=verify_copy)
+        if remove_exported:
+            os.remove(exported_p)
 
         return dest
 
     # --------------------------------------------------------------------------
     def publish_context(self,
                         context,
-                        repo=None):
+                        repo=None,
+                        link_mode=None,
+                        progress=None):
         """
         Given a context, gather all of the files in it (and any referenced
         contexts) to a temp location. Then publish these files to the publishing
@@ -446,6 +1002,13 @@ class Clam(object):
         :param context: The context we want to gather.
         :param repo: The repository to publish to. If None, then the default
                repository will be used. Defaults to None.
+        :param link_mode: How files are placed in the temp gather location:
+               "copy", "hardlink", "reflink" or "symlink". Since the temp gather
+               is only read by the store step, a link mode avoids copying every
+               byte twice when the gather location shares a volume with the
+               sources. If None, the link_mode set in the config is used.
+               Defaults to None.
+        :param progress: See publish_contexts. Defaults to None.
 
         :return: The directory where the context was gathered.
         """
@@ -453,30 +1016,67 @@ class Clam(object):
         assert(context.is_context())
         assert repo is None or (type(repo) is str and repo)
 
+        from libClarisse import libClarisse
+
         if not libClarisse.contexts_are_atomic(context):
             raise ClamError("Context is not atomic", 1001)
 
-        self.librarian.init_name()
-        self.librarian.init_schema()
-        self.librarian.init_store()
+        result = self.publish_contexts(contexts=[context],
+                                       repo=repo,
+                                       workers=1,
+                                       link_mode=link_mode,
+                                       progress=progress)[0]
+        if not result.success:
+            raise ClamError(result.error, result.error_code)
 
-        asset_name = context.get_name()
+        # TODO: Delete the gather_loc
+        # TODO: return the path to the published project
+        return "ljh"  # <-- this should be the path to the published project
 
-        try:
-            self.librarian.validate_name(asset_name, repo)
-        except SquirrelError as err:
-            raise ClamError(err.message, err.code)
+    # --------------------------------------------------------------------------
+    def trust_manifest(self):
+        """
+        If the gather manifest is trusted, the files are hashed while they are
+        gathered and the stored copy is checked against those hashes, instead
+        of having the librarian read every byte back a second time.
 
-        gather_parent_d = self.librarian.get_gather_loc()
-        gather_parent_d = tempfile.mkdtemp(dir=gather_parent_d)
-        gathered_loc = self.gather_context(context=context,
-                                           dest=gather_parent_d,
-                                           verbose=False)
+        :return: True if publishes should be verified against the gather
+                 manifest rather than by the librarian.
+        """
+
+        return self.do_verified_copy and self.trust_gather_manifest
+
+    # --------------------------------------------------------------------------
+    def store_gathered(self,
+                       asset_name,
+                       gathered_loc,
+                       repo=None):
+        """
+        Stores a gathered context in the publishing back end.
+
+        :param asset_name: The name of the asset being published.
+        :param gathered_loc: The directory where the context was gathered.
+        :param repo: The repository to publish to. If None, then the default
+               repository will be used. Defaults to None.
+
+        :return: The directory the asset was published into.
+        """
 
-        token = self.librarian.extract_token_from_name(context.get_name(), repo)
-        pub_loc = self.librarian.get_publish_loc(token, repo)
+        trust_manifest = self.trust_manifest()
 
-        self.librarian.store(name=asset_name,
+        # The gather manifest (which lists the artist's source paths) is only
+        # published when the stored copy is checked against it.
+        import manifest
+        manifest_p = os.path.join(gathered_loc, manifest.MANIFEST_NAME)
+        if not trust_manifest and os.path.exists(manifest_p):
+            os.remove(manifest_p)
+
+        librarian_obj = self.get_librarian(name=True, schema=True, store=True)
+
+        token = librarian_obj.extract_token_from_name(asset_name, repo)
+        pub_loc = librarian_obj.get_publish_loc(token, repo)
+
+        librarian_obj.store(name=asset_name,
                              asset_parent_d=pub_loc,
                              src_p=gathered_loc,
                              metadata=None,
@@ -486,11 +1086,280 @@ class Clam(object):
                              poster_frame=None,
                              merge=True,
                              pins=None,
-                             verify_copy=self.do_verified_copy)
+                             verify_copy=(self.do_verified_copy and
+                                          not trust_manifest))
 
-        # TODO: Delete the gather_loc
-        # TODO: return the path to the published project
-        return "ljh"  # <-- this should be the path to the published project
+        if trust_manifest:
+            self.verify_stored_copy(gathered_loc, pub_loc)
+
+        return pub_loc
+
+    # --------------------------------------------------------------------------
+    def publish_contexts(self,
+                         contexts,
+                         repo=None,
+                         workers=4,
+                         link_mode=None,
+                         progress=None):
+        """
+        Publishes a batch of contexts. All of the names are validated in a
+        single pass. The export, gather and store stages then run as a
+        pipeline: each context is exported (on the calling thread, since that
+        needs clarisse) and immediately handed to a pool of worker threads to
+        be gathered while the next one is exported, and a single thread stores
+        the gathered contexts as they arrive through a bounded queue. Within
+        each gather, projects are munged as soon as they have been copied. An
+        error in one context does not stop the others.
+
+        :param contexts: A list of contexts to publish.
+        :param repo: The repository to publish to. If None, then the default
+               repository will be used. Defaults to None.
+        :param workers: The number of contexts gathered at the same time. This
+               is also the number of gathered contexts allowed to wait for the
+               store step. Defaults to 4.
+        :param link_mode: See publish_context. Defaults to None.
+        :param progress: An optional function called each time a context
+               finishes a stage, with the arguments: stage ("export", "gather"
+               or "store"), the name of the context, the number of contexts
+               that have finished that stage so far, and the total number of
+               contexts. It may be called from any thread. Defaults to None.
+
+        :return: A list of PublishResult objects, one per context, in the same
+                 order as contexts.
+        """
+
+        assert type(contexts) is list
+        assert repo is None or (type(repo) is str and repo)
+        assert type(workers) is int and workers > 0
+
+        results, exports = self.export_for_publish(contexts, repo)
+
+        # Each context is exported as the pipeline asks for it, so exports
+        # overlap with the gathers of the contexts exported before them.
+        self.publish_exported(exports=exports,
+                              repo=repo,
+                              workers=workers,
+                              link_mode=link_mode,
+                              progress=progress,
+                              total=len(contexts))
+
+        return results
+
+    # --------------------------------------------------------------------------
+    def export_for_publish(self,
+                           contexts,
+                           repo=None):
+        """
+        Prepares a batch of contexts for publish_exported: the librarian is
+        initialized and every name is validated in a single pass. Each context
+        with a valid name is then exported (see export_context) as the
+        returned generator is iterated, which must happen on the thread that
+        owns the clarisse api.
+
+        :param contexts: A list of contexts to publish.
+        :param repo: The repository to publish to. If None, then the default
+               repository will be used. Defaults to None.
+
+        :return: A tuple of (a list of PublishResult objects, one per context in
+                 the same order as contexts, a generator yielding a tuple of
+                 (PublishResult, path to the exported project) for each context
+                 that was exported). Contexts that cannot be exported are
+                 failed in their PublishResult instead of being yielded.
+        """
+
+        assert type(contexts) is list
+        assert repo is None or (type(repo) is str and repo)
+
+        results = [publisher.PublishResult(context.get_name())
+                   for context in contexts]
+
+        self.get_librarian(name=True, schema=True, store=True)
+
+        self.validate_context_names(contexts, repo)
+
+        def exports():
+            for context, result in zip(contexts, results):
+                # Answered from the cache filled by validate_context_names
+                name_error = self._name_error(result.name, repo)
+                if name_error is not None:
+                    result.fail(*name_error)
+                    continue
+                try:
+                    exported_p = self.export_context(context)
+                except ClamError as e:
+                    result.fail(e.message, e.code)
+                    continue
+                yield result, exported_p
+
+        return results, exports()
+
+    # --------------------------------------------------------------------------
+    def publish_exported(self,
+                         exports,
+                         repo=None,
+                         workers=4,
+                         link_mode=None,
+                         progress=None,
+                         total=None,
+                         remove_exported=True,
+                         cancelled=None):
+        """
+        Publishes a batch of projects that have already been exported (the
+        gather and store stages of publish_contexts). Does not touch clarisse
+        (unless iterating exports does), so it may run on any thread. Each
+        project is handed to a pool of worker threads to be gathered into a
+        temp directory of its own, and a single thread stores the gathered
+        projects as they arrive through a bounded queue. An error in one
+        project does not stop the others: it is recorded in its PublishResult.
+
+        :param exports: An iterable of tuples of (PublishResult, path to the
+               exported project). The name of each PublishResult is the name
+               of the asset.
+        :param repo: The repository to publish to. If None, then the default
+               repository will be used. Defaults to None.
+        :param workers: The number of projects gathered at the same time. This
+               is also the number of gathered projects allowed to wait for the
+               store step. Defaults to 4.
+        :param link_mode: See publish_context. Defaults to None.
+        :param progress: See publish_contexts. The "export" stage is reported
+               as each project is taken from exports. Defaults to None.
+        :param total: The total number of projects passed to progress. Defaults
+               to None.
+        :param remove_exported: If True, each exported project is deleted once
+               it has been gathered. Defaults to True.
+        :param cancelled: An optional function that returns True once the batch
+               should stop. Projects that have not been stored by then are
+               failed instead. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        assert repo is None or (type(repo) is str and repo)
+        assert type(workers) is int and workers > 0
+        assert type(remove_exported) is bool
+
+        librarian_obj = self.get_librarian(name=True, schema=True, store=True)
+
+        verify_copy = self.trust_manifest()
+        gather_parent_d = tempfile.mkdtemp(dir=librarian_obj.get_gather_loc())
+
+        store_queue = queue.Queue(maxsize=workers)
+
+        completed = {"export": 0, "gather": 0, "store": 0}
+        completed_lock = threading.Lock()
+
+        def report(stage, name):
+            if progress is None:
+                return
+            with completed_lock:
+                completed[stage] += 1
+                count = completed[stage]
+            progress(stage, name, count, total)
+
+        def stop(result):
+            if cancelled is not None and cancelled():
+                result.fail(self.resc.message("job_cancelled").format(
+                    kind="publish", name=result.name))
+                return True
+            return False
+
+        def store_worker():
+            while True:
+                result = store_queue.get()
+                if result is None:
+                    return
+                if stop(result):
+                    continue
+                try:
+                    result.published_parent_d = self.store_gathered(
+                        result.name, result.gathered_d, repo)
+                    result.published = True
+                    report("store", result.name)
+                except (ClamError, SquirrelError) as e:
+                    result.fail(e.message, e.code)
+                except Exception as e:
+                    # Never let one asset take down the store thread
+                    result.fail(str(e))
+
+        def gather_worker(result, exported_p):
+            if stop(result):
+                if remove_exported:
+                    os.remove(exported_p)
+                return
+            try:
+                # Contexts under different parents may share a name, so each
+                # one is gathered into a directory of its own.
+                result.gathered_d = self.gather_exported_context(
+                    exported_p=exported_p,
+                    name=result.name,
+                    dest=tempfile.mkdtemp(dir=gather_parent_d),
+                    link_mode=link_mode,
+                    verify_copy=verify_copy,
+                    remove_exported=remove_exported)
+            except (ClamError, SquirrelError) as e:
+                result.fail(e.message, e.code)
+                return
+            except Exception as e:
+                result.fail(str(e))
+                return
+            report("gather", result.name)
+            store_queue.put(result)
+
+        store_thread = threading.Thread(target=store_worker)
+        store_thread.start()
+
+        # One stat session for the whole batch, shared by every gather
+        owns_stat_session = self.start_stat_session()
+
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+        try:
+            for result, exported_p in exports:
+                report("export", result.name)
+                pool.apply_async(gather_worker, (result, exported_p))
+        finally:
+            pool.close()
+            pool.join()
+            store_queue.put(None)
+            store_thread.join()
+            if owns_stat_session:
+                self.end_stat_session()
+
+    # --------------------------------------------------------------------------
+    def verify_stored_copy(self,
+                           gathered_d,
+                           stored_parent_d):
+        """
+        Verifies that the publishing back end stored an exact copy of a gather,
+        by hashing each stored file once and comparing it with the hash recorded
+        in the gather manifest (see manifest.Manifest.verify). Raises a clam
+        error if the stored copy cannot be found or does not match.
+
+        :param gathered_d: The gather directory (holding the manifest).
+        :param stored_parent_d: The directory somewhere beneath which the back
+               end stored the gathered files (along with their manifest).
+
+        :return: The directory holding the stored copy.
+        """
+
+        import manifest
+        gather_manifest = manifest.Manifest(gathered_d)
+
+        stored_d = gather_manifest.find_copy(stored_parent_d)
+        if stored_d is None:
+            err = self.resc.error(108)
+            err.msg = err.msg.format(gathered_d=gathered_d,
+                                     stored_parent_d=stored_parent_d)
+            raise ClamError(err.msg, err.code)
+
+        failures = gather_manifest.verify(stored_d)
+        if failures:
+            err = self.resc.error(109)
+            err.msg = err.msg.format(stored_d=stored_d,
+                                     files=", ".join(failures))
+            raise ClamError(err.msg, err.code)
+
+        return stored_d
 
     # --------------------------------------------------------------------------
     def publish_context_as_ref(self,
@@ -510,6 +1379,8 @@ class Clam(object):
 
         assert(context.is_context())
 
+        from libClarisse import libClarisse
+
         if not libClarisse.contexts_are_atomic(context):
             raise ClamError("Context is not atomic", 1001)
 
@@ -543,23 +1414,120 @@ class Clam(object):
         assert repo is None or (type(repo) is str and repo != "")
         assert type(display_success) is bool
 
-        self.librarian.init_name()
-
         names = list()
         for context in contexts:
             names.append(context.get_name())
 
+        results = self.validate_names(names, repo)
+
         self.invalid_asset_names = dict()
-        for name in names:
-            try:
-                self.librarian.validate_name(name, repo)
-            except SquirrelError as e:
-                self.invalid_asset_names[name] = e.message
+        for name in results:
+            if results[name] is not None:
+                self.invalid_asset_names[name] = results[name]
 
         if self.invalid_asset_names:
             return False
         return True
 
+    # --------------------------------------------------------------------------
+    def _name_error(self,
+                    name,
+                    repo=None):
+        """
+        Validates a single name against the given repo, remembering the answer
+        for as long as the librarian session lasts (see invalidate_librarian).
+
+        :param name: The asset name.
+        :param repo: The name of the repo to validate against. If None, then the
+               default repo will be used. Defaults to None.
+
+        :return: None if the name is valid, otherwise a tuple of (the error
+                 message, the error code).
+        """
+
+        key = (repo, name)
+        if key in self._name_errors:
+            return self._name_errors[key]
+
+        try:
+            self.get_librarian(name=True).validate_name(name, repo)
+            error = None
+        except SquirrelError as e:
+            error = (e.message, e.code)
+
+        self._name_errors[key] = error
+
+        return error
+
+    # --------------------------------------------------------------------------
+    def validate_names(self,
+                       names,
+                       repo=None):
+        """
+        Validates a list of asset names against the given repo in one call,
+        without raising an error for each invalid name. Each distinct name is
+        only ever checked by the librarian once: repeated names, and names
+        checked by earlier calls, are answered from a cache.
+
+        :param names: A list of asset names.
+        :param repo: The name of the repo to validate against. If None, then the
+               default repo will be used. Defaults to None.
+
+        :return: A dictionary keyed on each (distinct) name, where the value is
+                 None if the name is valid, or the reason it is invalid.
+        """
+
+        assert type(names) is list
+        assert repo is None or (type(repo) is str and repo != "")
+
+        output = dict()
+        for name in names:
+            if name not in output:
+                error = self._name_error(name, repo)
+                output[name] = None if error is None else error[0]
+
+        return output
+
+    # --------------------------------------------------------------------------
+    def validate_name(self,
+                      name,
+                      repo=None):
+        """
+        Validates a single asset name against the given repo (using the same
+        cache as validate_names). Raises a ClamError if the name is invalid.
+
+        :param name: The asset name.
+        :param repo: The name of the repo to validate against. If None, then the
+               default repo will be used. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        error = self._name_error(name, repo)
+        if error is not None:
+            raise ClamError(error[0], error[1])
+
+    # --------------------------------------------------------------------------
+    def asset_template(self):
+        """
+        Returns the compiled asset template that defines the layout of new
+        assets. This is the template in the CLAM_ASSET_TEMPLATE_PATH env
+        variable if set, otherwise the one shipped in the config directory. It
+        is only compiled again when the file changes. Raises a clam error if
+        the template is invalid.
+
+        :return: An AssetTemplate object.
+        """
+
+        template_p = os.environ.get(assettemplate.TEMPLATE_ENV_VAR,
+                                    ASSET_TEMPLATE_P)
+        try:
+            return assettemplate.load_template(template_p)
+        except ValueError as e:
+            err = self.resc.error(503)
+            err.msg = err.msg.format(template_p=template_p, problem=str(e))
+            raise ClamError(err.msg, err.code)
+
     # --------------------------------------------------------------------------
     def create_empty_asset_structure(self,
                                      name,
@@ -598,11 +1566,57 @@ class Clam(object):
             variant_count = 1
 
         if validate_name:
-            self.librarian.init_name()
-            try:
-                self.librarian.validate_name(name)
-            except SquirrelError as e:
-                raise ClamError(e.message, e.code)
+            self.validate_name(name)
+
+        return self.create_empty_asset_structures(names=[name],
+                                                  variant_count=variant_count,
+                                                  parent_context=parent_context,
+                                                  existing_geo=existing_geo,
+                                                  validate_names=False)[0]
+
+    # --------------------------------------------------------------------------
+    def create_empty_asset_structures(self,
+                                      names,
+                                      variant_count=None,
+                                      parent_context=None,
+                                      existing_geo=None,
+                                      validate_names=True):
+        """
+        Create any number of new asset contexts in Clarisse in one go (see
+        create_empty_asset_structure). Every asset is described first, then
+        all of them are created in a single clarisse command batch (one undo
+        step) using as few clarisse commands as possible. Nothing is created if
+        any name is invalid or already exists.
+
+        :param names: A list of asset names.
+        :param variant_count: The number of variants each asset will have. If
+               None, then defaults to 1.
+        :param parent_context: The context into which the new assets will be
+               created. If None, then they will be created at the root of the
+               project.
+        :param existing_geo: If given as a list of contexts or items, these will
+               be moved into the variant contexts of the first asset. Expects a
+               list or None. Defaults to None.
+        :param validate_names: If True, then the names will be validated against
+               the librarian. If False, then any name will be accepted.
+
+        :return: A list of the new asset contexts, in the same order as names.
+        """
+
+        assert type(names) is list
+        for name in names:
+            assert type(name) is str and name
+        assert variant_count is None or type(variant_count) is int
+        assert parent_context is None or parent_context.is_context()
+        assert existing_geo is None or type(existing_geo) is list
+        assert type(validate_names) is bool
+
+        if not variant_count:
+            variant_count = 1
+
+        if validate_names:
+            for name in names:
+                self.validate_name(name)
 
         if not parent_context:
             context_url = r"project://"
@@ -613,80 +1627,115 @@ class Clam(object):
             msg = self.resc.error(103)
             raise ClamError(msg, 103)
 
-        asset_url = "/".join([context_url, name])
-
-        if ix.item_exists(asset_url):
-            err = self.resc.error(105)
-            err.msg = err.msg.format(name=name)
-            raise ClamError(err.msg, 105)
-
-        geo_url = "/".join([asset_url, "geo"])
-        var_urls = list()
-        shading_url = "/".join([asset_url, "shading"])
-        maps_url = "/".join([shading_url, "maps"])
-        support_url = "/".join([shading_url, "support"])
-        shaders_url = "/".join([shading_url, "shaders"])
-
-        asset_context = libClarisse.create_context(asset_url)
-        libClarisse.create_context(geo_url)
-        libClarisse.create_context(shading_url)
-        libClarisse.create_context(maps_url)
-        libClarisse.create_context(support_url)
-        libClarisse.create_context(shaders_url)
-
-        for i in range(variant_count):
-            var_n = "var" + str(i + 1)
-            var_url = "/".join([geo_url, var_n])
-            var_urls.append(var_url)
-            libClarisse.create_context(var_url)
-
-            geo_gr = ix.cmds.CreateObject("geo_gr",
-                                          "Group",
-                                          "Global",
-                                          var_url)
-
-            geo_gr_n = geo_gr.get_full_name()
-
-            ix.cmds.SetValues([geo_gr_n + ".inclusion_rule[0]"],
-                              ["./*"])
-            ix.cmds.SetValues([geo_gr_n + ".exclusion_rule[0]"],
-                              ["*_HDN*"])
-
-            out_combiner = ix.cmds.CreateObject(
-                name + "_" + var_n + "_OUT",
-                "SceneObjectCombiner",
-                "Global",
-                asset_url)
-
-            ix.cmds.AddValues([out_combiner.get_full_name() + ".objects"],
-                              [geo_gr_n])
-
-        if existing_geo:
-            i = 0
-            for existing in existing_geo:
-                ix.cmds.MoveItemTo(existing.get_full_name(), var_urls[i])
-                i += 1
-
-        material = ix.cmds.CreateObject(name + "_MAT",
-                                        "MaterialPhysicalStandard",
-                                        shaders_url)
-
-        shading_layer = ix.cmds.CreateObject(name + "_sl",
-                                             "ShadingLayer",
-                                             "Global",
-                                             asset_url)
-
-        ix.cmds.AddShadingLayerRule(shading_layer.get_full_name(),
-                                    0,
-                                    ["filter", "", "is_visible", "1"])
-
-        ix.cmds.SetShadingLayerRulesProperty(shading_layer.get_full_name(),
-                                             [0],
-                                             "filter",
-                                             ["*/" + name + "/geo/*"])
-
-        ix.cmds.SetShadingLayerRulesProperty(shading_layer.get_full_name(),
-                                             [0], "material",
-                                             [material.get_full_name()])
-
-        return asset_context
+        template = self.asset_template()
+        builder = assetbuilder.AssetBuilder()
+
+        for i, name in enumerate(names):
+
+            if (name in names[:i] or
+                    ix.item_exists("/".join([context_url, name]))):
+                err = self.resc.error(105)
+                err.msg = err.msg.format(name=name)
+                raise ClamError(err.msg, 105)
+
+            existing_names = None
+            if existing_geo and i == 0:
+                existing_names = [existing.get_full_name() for
+                                  existing in existing_geo]
+
+            builder.add(template.plan(name=name,
+                                      context_url=context_url,
+                                      variant_count=variant_count,
+                                      existing_geo=existing_names))
+
+        return builder.build()
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def rename_assets(assets):
+        """
+        Renames a list of legacy assets (and the items inside them) to the
+        current naming convention: the camel case description is converted to
+        snake case and the variant is upper cased. Every rename is worked out
+        first, then all of them are applied in a single clarisse command batch.
+        Nothing is renamed if any of the assets cannot be.
+
+        :param assets: A list of asset contexts.
+
+        :return: A dictionary keyed on the url of each asset that was renamed,
+                 where the value is its new name.
+        """
+
+        assert type(assets) is list
+        for asset in assets:
+            assert asset.is_context()
+
+        renames = renamer.plan_renames(assets)
+        renamer.apply_renames(renames)
+
+        output = dict()
+        for rename in renames:
+            output[rename.asset_url] = rename.new_name
+
+        return output
+
+
+# ------------------------------------------------------------------------------
+def config_path():
+    """
+    :return: The path to the clam config currently in effect (the
+             CLAM_CONFIG_PATH env variable if it is set, otherwise the config
+             shipped with clam).
+    """
+
+    return os.environ.get(CONFIG_ENV_VAR, CONFIG_P)
+
+
+# ------------------------------------------------------------------------------
+def get_clam(language="english"):
+    """
+    Returns the process-wide Clam object for a language and config, creating
+    it the first time it is asked for. Shelf tools use this instead of building
+    a new Clam object on every click, so the resources, config and librarian
+    session are only loaded once per clarisse session. The config is re-read
+    (and the librarian session thrown away) whenever its file has been
+    modified since it was last read.
+
+    :param language: The language used for communication with the end user.
+           Defaults to "english".
+
+    :return: A Clam object.
+    """
+
+    key = (language, config_path())
+    try:
+        mtime = os.path.getmtime(key[1])
+    except OSError:
+        mtime = None
+
+    with _clam_objs_lock:
+        if key not in _clam_objs:
+            _clam_objs[key] = (Clam(language), mtime)
+        elif _clam_objs[key][1] != mtime:
+            clam_obj = _clam_objs[key][0]
+            clam_obj.load_config()
+            clam_obj.invalidate_librarian()
+            _clam_objs[key] = (clam_obj, mtime)
+
+        return _clam_objs[key][0]
+
+
+# ------------------------------------------------------------------------------
+def invalidate_librarians():
+    """
+    Throws away the librarian session (and everything cached from it, i.e.
+    name validation results and which files are already published) of every
+    Clam object created by get_clam. Lets an artist pick up assets published
+    (or squirrel config changes made) elsewhere during a clarisse session.
+
+    :return: Nothing.
+    """
+
+    with _clam_objs_lock:
+        for clam_obj, mtime in _clam_objs.values():
+            clam_obj.invalidate_librarian()
@@ -0,0 +1,443 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+from multiprocessing.pool import ThreadPool
+import os
+
+from squirrel.shared.squirrelerror import SquirrelError
+
+import bulkscan
+import clam
+from clamerror import ClamError
+import copier
+import publisher
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+# ------------------------------------------------------------------------------
+def build_parser():
+    """
+    :return: The argparse parser for the command line.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="clam",
+        description="Scan, gather and publish clarisse projects that have "
+                    "already been exported to disk, without clarisse.",
+        epilog="Exits with 0 if every project succeeded, 1 if any project "
+               "failed and 2 if the command line is invalid.")
+
+    parser.add_argument("--language",
+                        default=os.environ.get("CLAM_LANGUAGE", "english"),
+                        help="The language used for messages. Defaults to "
+                             "$CLAM_LANGUAGE, or english.")
+    parser.add_argument("--json",
+                        action="store_true",
+                        help="Print the results as json.")
+    parser.add_argument("--jobs", "-j",
+                        type=int,
+                        default=1,
+                        help="The number of projects worked on at the same "
+                             "time. Defaults to 1.")
+
+    sub_parsers = parser.add_subparsers(dest="command")
+    sub_parsers.required = True
+
+    scan_parser = sub_parsers.add_parser(
+        "scan",
+        help="List every sub-project and file referenced by the projects.")
+    scan_parser.add_argument("projects", nargs="+")
+
+    gather_parser = sub_parsers.add_parser(
+        "gather",
+        help="Gather each project (and everything it references) into a "
+             "sub-directory of DEST named after the project.")
+    gather_parser.add_argument("projects", nargs="+")
+    gather_parser.add_argument("--dest",
+                               required=True,
+                               help="The directory to gather into.")
+    gather_parser.add_argument("--incremental",
+                               action="store_true",
+                               help="Only copy files that changed since the "
+                                    "last gather into the same directory.")
+    gather_parser.add_argument("--use-hash",
+                               action="store_true",
+                               help="With --incremental, compare file contents "
+                                    "rather than sizes and times.")
+    gather_parser.add_argument("--link-mode",
+                               choices=copier.LINK_MODES,
+                               default=None,
+                               help="How files are placed in the gather. "
+                                    "Defaults to the link_mode in the config.")
+    gather_parser.add_argument("--verify",
+                               action="store_true",
+                               help="Hash every file as it is copied (into "
+                                    "the gather manifest) and check the size "
+                                    "of every copy.")
+    gather_parser.add_argument("--verbose",
+                               action="store_true",
+                               help="Print each file as it is copied (ignored "
+                                    "with --json).")
+
+    audit_parser = sub_parsers.add_parser(
+        "audit",
+        help="Scan every project in a directory tree (using one process per "
+             "job) and report every referenced file, every missing file and "
+             "the projects that reference each of them.")
+    audit_parser.add_argument("paths",
+                              nargs="+",
+                              help="Projects and/or directories to search for "
+                                   "projects.")
+
+    publish_parser = sub_parsers.add_parser(
+        "publish",
+        help="Publish each project as an asset named after the project file.")
+    publish_parser.add_argument("projects", nargs="+")
+    publish_parser.add_argument("--repo",
+                                default=None,
+                                help="The repository to publish to. Defaults "
+                                     "to the default repository.")
+    publish_parser.add_argument("--link-mode",
+                                choices=copier.LINK_MODES,
+                                default=None,
+                                help="How files are placed in the temp "
+                                     "gather. Defaults to the link_mode in the "
+                                     "config.")
+
+    return parser
+
+
+# ------------------------------------------------------------------------------
+def project_name(project_p):
+    """
+    :param project_p: The path to a project.
+
+    :return: The name of the project (its file name without the extension).
+    """
+
+    return os.path.splitext(os.path.basename(project_p))[0]
+
+
+# ------------------------------------------------------------------------------
+def check_project(project_p):
+    """
+    Raises a clam error if the path is not an existing clarisse project.
+
+    :param project_p: The path to test.
+
+    :return: Nothing.
+    """
+
+    if not os.path.isfile(project_p) or not project_p.endswith(".project"):
+        raise ClamError("Not a clarisse project: " + project_p, 1)
+
+
+# ------------------------------------------------------------------------------
+def run_each(function,
+             items,
+             jobs):
+    """
+    Calls function on every item, using up to jobs threads. Any error (clam,
+    squirrel or file system) is caught and returned in place of that item's
+    result, so one bad project never stops the others.
+
+    :param function: The function to call. Must return a dictionary.
+    :param items: The items to call it with.
+    :param jobs: The number of items worked on at the same time.
+
+    :return: A list of dictionaries in the same order as items. Each one has a
+             "success" key and, if it failed, an "error" key.
+    """
+
+    def run(item):
+        try:
+            result = function(item)
+            result["success"] = True
+        except (ClamError, SquirrelError) as e:
+            result = {"project": item, "success": False, "error": e.message}
+        except (IOError, OSError) as e:
+            result = {"project": item, "success": False, "error": str(e)}
+        return result
+
+    if jobs == 1 or len(items) < 2:
+        return [run(item) for item in items]
+
+    pool = ThreadPool(min(jobs, len(items)))
+    try:
+        return pool.map(run, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+# ------------------------------------------------------------------------------
+def scan(clam_obj,
+         args):
+    """
+    Lists the sub-projects and files referenced by each project.
+
+    :param clam_obj: The Clam object.
+    :param args: The parsed command line.
+
+    :return: A list of result dictionaries, one per project.
+    """
+
+    def scan_project(project_p):
+        check_project(project_p)
+        graph = clam_obj.project_graph(project_p)
+        return {"project": project_p,
+                "sub_projects": graph.sub_projects(project_p),
+                "references": graph.references(project_p),
+                "cycles": graph.cycles}
+
+    owns_stat_session = clam_obj.start_stat_session()
+    try:
+        return run_each(scan_project, args.projects, args.jobs)
+    finally:
+        if owns_stat_session:
+            clam_obj.end_stat_session()
+
+
+# ------------------------------------------------------------------------------
+def audit(clam_obj,
+          args):
+    """
+    Scans whole directory trees of projects with a bulk scanner. Fails if any
+    referenced file is missing or any project could not be read.
+
+    :param clam_obj: The Clam object (unused: the scan runs in worker
+           processes).
+    :param args: The parsed command line.
+
+    :return: A list holding a single result dictionary: the report.
+    """
+
+    report = bulkscan.BulkScanner(args.jobs).scan(args.paths)
+
+    result = report.to_dict()
+    result["success"] = not (report.missing or report.errors)
+    if not result["success"]:
+        result["error"] = (str(len(report.missing)) + " missing file(s), " +
+                           str(len(report.errors)) + " unreadable project(s)")
+
+    return [result]
+
+
+# ------------------------------------------------------------------------------
+def gather(clam_obj,
+           args):
+    """
+    Gathers each project into a sub-directory of args.dest named after the
+    project. Projects that share a name (e.g. two asset.project files from
+    different directories) would be gathered into the same directory, so none
+    of them are gathered.
+
+    :param clam_obj: The Clam object.
+    :param args: The parsed command line.
+
+    :return: A list of result dictionaries, one per project.
+    """
+
+    if not os.path.isdir(args.dest):
+        raise ClamError("Gather destination does not exist: " + args.dest, 1)
+
+    verbose = args.verbose and not args.json
+
+    name_counts = dict()
+    for project_p in args.projects:
+        name = project_name(project_p)
+        name_counts[name] = name_counts.get(name, 0) + 1
+
+    def gather_project(project_p):
+        check_project(project_p)
+        name = project_name(project_p)
+        if name_counts[name] > 1:
+            raise ClamError("More than one project is named " + name + ", so "
+                            "they would be gathered into the same directory. "
+                            "Gather them to different destinations.", 1)
+        dest = os.path.join(args.dest, name)
+        if not os.path.exists(dest):
+            os.mkdir(dest)
+        clam_obj.gather_project(project_p=project_p,
+                                dest=dest,
+                                verbose=verbose,
+                                incremental=args.incremental,
+                                use_hash=args.use_hash,
+                                link_mode=args.link_mode,
+                                verify_copy=args.verify)
+        return {"project": project_p,
+                "gathered": dest}
+
+    owns_stat_session = clam_obj.start_stat_session()
+    try:
+        return run_each(gather_project, args.projects, args.jobs)
+    finally:
+        if owns_stat_session:
+            clam_obj.end_stat_session(verbose)
+
+
+# ------------------------------------------------------------------------------
+def publish(clam_obj,
+            args):
+    """
+    Publishes each project as an asset named after the project file, using the
+    same gather and store pipeline as publishing from clarisse (see
+    Clam.publish_exported). The projects themselves are left untouched.
+
+    :param clam_obj: The Clam object.
+    :param args: The parsed command line.
+
+    :return: A list of result dictionaries, one per project.
+    """
+
+    results = list()
+    exports = list()
+    for project_p in args.projects:
+        publish_result = publisher.PublishResult(project_name(project_p))
+        results.append(publish_result)
+        try:
+            check_project(project_p)
+            clam_obj.validate_name(publish_result.name, args.repo)
+        except (ClamError, SquirrelError) as e:
+            publish_result.fail(e.message, e.code)
+            continue
+        exports.append((publish_result, project_p))
+
+    clam_obj.publish_exported(exports=exports,
+                              repo=args.repo,
+                              workers=args.jobs,
+                              link_mode=args.link_mode,
+                              total=len(args.projects),
+                              remove_exported=False)
+
+    output = list()
+    for project_p, publish_result in zip(args.projects, results):
+        if publish_result.success:
+            output.append({"project": project_p,
+                           "name": publish_result.name,
+                           "published": publish_result.published_parent_d,
+                           "success": True})
+        else:
+            output.append({"project": project_p,
+                           "name": publish_result.name,
+                           "success": False,
+                           "error": str(publish_result.error)})
+
+    return output
+
+
+# ------------------------------------------------------------------------------
+def print_text(command,
+               results):
+    """
+    Prints the results in a human readable form.
+
+    :param command: The command that was run.
+    :param results: The list of result dictionaries.
+
+    :return: Nothing.
+    """
+
+    for result in results:
+
+        if command == "audit" and "projects" in result:
+            print(str(len(result["projects"])) + " projects, " +
+                  str(len(result["references"])) + " referenced files")
+            for file_p in sorted(result["missing"]):
+                print("missing: " + file_p)
+                for project_p in result["missing"][file_p]:
+                    print("    referenced by: " + project_p)
+            for project_p in sorted(result["errors"]):
+                print("unreadable: " + project_p + " - " +
+                      result["errors"][project_p])
+            for cycle in result["cycles"]:
+                print("cycle: " + " -> ".join(cycle))
+
+        project_p = result.get("project")
+        if not result["success"]:
+            if project_p:
+                print("FAILED: " + project_p + " - " + result["error"])
+            else:
+                print("FAILED: " + result["error"])
+            continue
+
+        if command == "scan":
+            print(project_p)
+            for sub_project_p in result["sub_projects"]:
+                print("    project: " + sub_project_p)
+            for file_p in result["references"]:
+                print("    file: " + file_p)
+            for cycle in result["cycles"]:
+                print("    cycle: " + " -> ".join(cycle))
+        elif command == "gather":
+            print(project_p + " -> " + result["gathered"])
+        elif command == "publish":
+            print(project_p + " -> " + result["published"])
+
+
+# ------------------------------------------------------------------------------
+def main(argv=None):
+    """
+    Runs the command line.
+
+    :param argv: The arguments (without the program name). If None, then
+           sys.argv is used. Defaults to None.
+
+    :return: The exit code.
+    """
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    commands = {"audit": audit,
+                "scan": scan,
+                "gather": gather,
+                "publish": publish}
+
+    try:
+        clam_obj = clam.Clam(args.language)
+        results = commands[args.command](clam_obj, args)
+    except (ClamError, SquirrelError) as e:
+        results = [{"success": False, "error": e.message}]
+    except (IOError, OSError) as e:
+        results = [{"success": False, "error": str(e)}]
+
+    if args.json:
+        print(json.dumps({"command": args.command, "results": results},
+                         indent=2,
+                         sort_keys=True))
+    else:
+        print_text(args.command, results)
+
+    if all(result["success"] for result in results):
+        return EXIT_OK
+    return EXIT_FAILED
@@ -0,0 +1,401 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import errno
+import hashlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+import os
+import shutil
+import threading
+import time
+
+import manifest
+
+
+BUFFER_SIZE = 4 * 1024 * 1024
+
+TRANSIENT_ERRNOS = set([errno.EAGAIN,
+                        errno.EBUSY,
+                        errno.EINTR,
+                        errno.EIO,
+                        errno.ETIMEDOUT])
+if hasattr(errno, "ESTALE"):
+    TRANSIENT_ERRNOS.add(errno.ESTALE)
+
+LINK_MODES = ["copy", "hardlink", "reflink", "symlink"]
+
+# Errors that mean "this kind of link is not possible here" (crossing devices,
+# file system without support, etc.) as opposed to a genuine failure.
+LINK_FALLBACK_ERRNOS = set([errno.EXDEV,
+                            errno.EPERM,
+                            errno.EMLINK,
+                            errno.EINVAL,
+                            errno.ENOTTY,
+                            errno.ENOSYS])
+for _name in ("ENOTSUP", "EOPNOTSUPP"):
+    if hasattr(errno, _name):
+        LINK_FALLBACK_ERRNOS.add(getattr(errno, _name))
+
+# Linux ioctl that makes a copy-on-write clone of a file (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Files that are modified after being gathered are never linked.
+NEVER_LINK_EXTENSIONS = (".project",)
+
+
+# ==============================================================================
+class CopyStats(object):
+
+    """
+    Aggregate numbers for a batch of copies.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Initialize the object.
+
+        :return: Nothing.
+        """
+
+        self.files = 0
+        self.bytes = 0
+        self.linked = 0
+        self.retries = 0
+        self.short_copies = 0
+        self.seconds = 0.0
+
+    # --------------------------------------------------------------------------
+    @property
+    def throughput(self):
+        """
+        :return: The average throughput of the batch in bytes per second.
+        """
+
+        if not self.seconds:
+            return 0.0
+        return self.bytes / self.seconds
+
+
+# ==============================================================================
+class Copier(object):
+
+    """
+    Copies a batch of files using a bounded pool of threads. The largest files
+    are started first so that one huge cache does not end up being copied on
+    its own after everything else has finished, and copies that fail with a
+    transient error (common on network storage) are retried.
+
+    Instead of copying, files may be hard linked, reflinked (a copy-on-write
+    clone, where the file system supports it) or symlinked to their source.
+    Whenever the requested link is not possible (for example when the
+    destination is on another device) the file is copied instead. Note that a
+    hard linked file shares its contents with the source, so editing either
+    one in place edits both.
+
+    If requested, each file is hashed while it is being copied (so the data is
+    only read once). The size of each copy can also be checked, which catches
+    a short write but not corrupt contents (compare the stored copy with the
+    recorded hashes for that, see manifest.Manifest.verify). A copy of the
+    wrong size is treated like a transient error: the source is read again and
+    the copy retried.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 workers=4,
+                 retries=3,
+                 retry_delay=1.0,
+                 link_mode="copy",
+                 hash_files=False,
+                 check_size=False):
+        """
+        Initialize the object.
+
+        :param workers: The number of files copied at the same time. Defaults
+               to 4.
+        :param retries: How many times a copy that failed with a transient
+               error is tried again before giving up. Defaults to 3.
+        :param retry_delay: The number of seconds to wait before the first
+               retry. The delay doubles with each subsequent retry. Defaults to
+               1.0.
+        :param link_mode: One of LINK_MODES: "copy", "hardlink", "reflink" or
+               "symlink". Project files are always copied. Defaults to "copy".
+        :param hash_files: If True, the sha1 hash of every source file is
+               computed while it is copied and stored in self.hashes. Defaults
+               to False.
+        :param check_size: If True, the size of every copy is checked against
+               the number of bytes read from the source, and the copy retried
+               (reading the source again) if they differ. Defaults to False.
+
+        :return: Nothing.
+        """
+
+        assert type(workers) is int and workers > 0
+        assert type(retries) is int and retries >= 0
+        assert link_mode in LINK_MODES
+
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.link_mode = link_mode
+        self.check_size = check_size
+        self.hash_files = hash_files
+
+        self.stats = CopyStats()
+        self.hashes = dict()
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _make_dirs(dir_d):
+        """
+        Creates a directory (and its parents), tolerating other threads creating
+        the same directory at the same time.
+
+        :param dir_d: The directory to create.
+
+        :return: Nothing.
+        """
+
+        if os.path.isdir(dir_d):
+            return
+        try:
+            os.makedirs(dir_d)
+        except OSError:
+            if not os.path.isdir(dir_d):
+                raise
+
+    # --------------------------------------------------------------------------
+    def copy_file(self,
+                  source_p,
+                  dest_p):
+        """
+        Copies a single file (including its permission bits and times),
+        creating the destination directory if needed.
+
+        :param source_p: The file to copy.
+        :param dest_p: The full path of the copy.
+
+        :return: A tuple of (the number of bytes copied, the sha1 hash of the
+                 data that was copied or None if hash_files is False).
+        """
+
+        self._make_dirs(os.path.dirname(dest_p))
+
+        # Never write through an existing link (e.g. left by an earlier gather
+        # that used a link mode): that would overwrite the source file.
+        if os.path.lexists(dest_p):
+            os.remove(dest_p)
+
+        hash_obj = None
+        if self.hash_files:
+            hash_obj = hashlib.sha1()
+
+        copied = 0
+        with open(source_p, "rb") as source_f:
+            with open(dest_p, "wb") as dest_f:
+                block = source_f.read(BUFFER_SIZE)
+                while block:
+                    dest_f.write(block)
+                    if hash_obj is not None:
+                        hash_obj.update(block)
+                    copied += len(block)
+                    block = source_f.read(BUFFER_SIZE)
+
+        shutil.copystat(source_p, dest_p)
+
+        # Only the size is checked (the copy is not read back), so this catches
+        # a short write, not corrupt contents.
+        if self.check_size and os.path.getsize(dest_p) != copied:
+            with self._lock:
+                self.stats.short_copies += 1
+            raise IOError(errno.EIO, "Copy is not the size of its source",
+                          dest_p)
+
+        if hash_obj is None:
+            return copied, None
+
+        return copied, hash_obj.hexdigest()
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _reflink(source_p,
+                 dest_p):
+        """
+        Makes a copy-on-write clone of a file. Only supported on linux file
+        systems that implement the FICLONE ioctl.
+
+        :param source_p: The file to clone.
+        :param dest_p: The full path of the clone.
+
+        :return: Nothing.
+        """
+
+        if fcntl is None:
+            raise OSError(errno.ENOSYS, "reflinks are not supported")
+
+        with open(source_p, "rb") as source_f:
+            with open(dest_p, "wb") as dest_f:
+                fcntl.ioctl(dest_f.fileno(), FICLONE, source_f.fileno())
+
+        shutil.copystat(source_p, dest_p)
+
+    # --------------------------------------------------------------------------
+    def link_file(self,
+                  source_p,
+                  dest_p):
+        """
+        Links a single file to its destination using link_mode, creating the
+        destination directory if needed. Falls back to a regular copy when the
+        link is not possible.
+
+        :param source_p: The file to link.
+        :param dest_p: The full path of the link.
+
+        :return: A tuple of (the number of bytes copied or linked, the sha1
+                 hash of the file or None if hash_files is False, True if the
+                 file was linked rather than copied).
+        """
+
+        if (self.link_mode == "copy" or
+                dest_p.endswith(NEVER_LINK_EXTENSIONS)):
+            return self.copy_file(source_p, dest_p) + (False,)
+
+        self._make_dirs(os.path.dirname(dest_p))
+
+        if os.path.lexists(dest_p):
+            os.remove(dest_p)
+
+        try:
+            if self.link_mode == "hardlink":
+                os.link(source_p, dest_p)
+            elif self.link_mode == "reflink":
+                self._reflink(source_p, dest_p)
+            else:
+                os.symlink(os.path.abspath(source_p), dest_p)
+        except (IOError, OSError) as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            if os.path.lexists(dest_p):
+                os.remove(dest_p)
+            return self.copy_file(source_p, dest_p) + (False,)
+
+        file_hash = None
+        if self.hash_files:
+            file_hash = manifest.hash_file(source_p)
+
+        return os.path.getsize(source_p), file_hash, True
+
+    # --------------------------------------------------------------------------
+    def _copy_with_retries(self,
+                           job):
+        """
+        Copies a single file, retrying on transient errors.
+
+        :param job: A tuple of (source path, destination path).
+
+        :return: The job that was passed in.
+        """
+
+        source_p, dest_p = job
+
+        attempt = 0
+        while True:
+            try:
+                copied, file_hash, linked = self.link_file(source_p, dest_p)
+                break
+            except (IOError, OSError) as e:
+                if e.errno not in TRANSIENT_ERRNOS or attempt >= self.retries:
+                    raise
+                with self._lock:
+                    self.stats.retries += 1
+                time.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += copied
+            if linked:
+                self.stats.linked += 1
+            if file_hash is not None:
+                self.hashes[source_p] = file_hash
+
+        return job
+
+    # --------------------------------------------------------------------------
+    def copy_files(self,
+                   remapped,
+                   callback=None):
+        """
+        Copies every file in remapped to its new location.
+
+        :param remapped: A dictionary where the key is the source path and the
+               value is the destination path.
+        :param callback: An optional function called (from the calling thread)
+               with the source and destination path after each file has been
+               copied. Defaults to None.
+
+        :return: A CopyStats object for this batch.
+        """
+
+        assert type(remapped) is dict
+
+        self.stats = CopyStats()
+        self.hashes = dict()
+
+        sizes = dict()
+        for source_p in remapped:
+            try:
+                sizes[source_p] = os.path.getsize(source_p)
+            except OSError:
+                sizes[source_p] = 0
+
+        jobs = [(source_p, remapped[source_p]) for source_p in
+                sorted(remapped, key=lambda path: sizes[path], reverse=True)]
+
+        start = time.time()
+
+        if self.workers == 1 or len(jobs) < 2:
+            for job in jobs:
+                self._copy_with_retries(job)
+                if callback:
+                    callback(*job)
+        else:
+            # Imported here as multiprocessing is slow to import
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(self.workers, len(jobs)))
+            try:
+                for job in pool.imap_unordered(self._copy_with_retries, jobs):
+                    if callback:
+                        callback(*job)
+            finally:
+                pool.close()
+                pool.join()
+
+        self.stats.seconds = time.time() - start
+
+        return self.stats
@@ -0,0 +1,373 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import itertools
+import os
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import threading
+
+from squirrel.shared.squirrelerror import SquirrelError
+
+from clamerror import ClamError
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+# ==============================================================================
+class Job(object):
+
+    """
+    A single gather or publish running in the background.
+    """
+
+    _ids = itertools.count(1)
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 kind,
+                 name,
+                 work,
+                 callback=None,
+                 cleanup=None):
+        """
+        Initialize the object.
+
+        :param kind: What sort of job this is ("gather" or "publish").
+        :param name: The name of the context being worked on.
+        :param work: A function that does the actual work. It is passed this
+               job (so that it can check cancel_requested) and its return value
+               becomes the job's result.
+        :param callback: An optional function called with this job once it has
+               finished, failed or been cancelled. It is called from the worker
+               thread, so it must not touch the clarisse api. Defaults to None.
+        :param cleanup: An optional function called with this job if it is
+               cancelled (whether or not it had started), to remove anything
+               that was prepared for it (i.e. exported projects). It must
+               tolerate work having removed some of it already. Defaults to
+               None.
+
+        :return: Nothing.
+        """
+
+        self.id = next(self._ids)
+        self.kind = kind
+        self.name = name
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.error_code = None
+        self.cancel_requested = False
+
+        self._work = work
+        self._callback = callback
+        self._cleanup = cleanup
+        self._finished = threading.Event()
+
+    # --------------------------------------------------------------------------
+    def cancel(self):
+        """
+        Asks for the job to be cancelled. A queued job will never start. A
+        running job stops at the next point where it is safe to do so (i.e. a
+        publish that has finished gathering will not be stored).
+
+        :return: Nothing.
+        """
+
+        self.cancel_requested = True
+
+    # --------------------------------------------------------------------------
+    def done(self):
+        """
+        :return: True if the job has finished, failed or been cancelled.
+        """
+
+        return self._finished.is_set()
+
+    # --------------------------------------------------------------------------
+    def wait(self,
+             timeout=None):
+        """
+        Blocks until the job is done.
+
+        :param timeout: The maximum number of seconds to wait. If None, waits
+               forever. Defaults to None.
+
+        :return: True if the job is done, False if the timeout expired first.
+        """
+
+        self._finished.wait(timeout)
+        return self._finished.is_set()
+
+    # --------------------------------------------------------------------------
+    def run(self):
+        """
+        Runs the job (called by the queue's worker thread).
+
+        :return: Nothing.
+        """
+
+        if self.cancel_requested:
+            self.status = CANCELLED
+        else:
+            self.status = RUNNING
+            try:
+                self.result = self._work(self)
+                if self.cancel_requested:
+                    self.status = CANCELLED
+                else:
+                    self.status = DONE
+            except (ClamError, SquirrelError) as e:
+                self.status = FAILED
+                self.error = e.message
+                self.error_code = e.code
+            except Exception as e:
+                # A background job must never take its worker thread down
+                self.status = FAILED
+                self.error = str(e)
+
+        if self.status == CANCELLED and self._cleanup:
+            try:
+                self._cleanup(self)
+            except (IOError, OSError):
+                pass
+
+        self._finished.set()
+
+        if self._callback:
+            self._callback(self)
+
+
+# ==============================================================================
+class JobQueue(object):
+
+    """
+    Runs gathers and publishes in the background so that clarisse is never
+    frozen while files are copied. The only work done on the calling thread is
+    the part that has to talk to clarisse: exporting the context to a temp
+    project. Scanning, copying, munging and storing all happen on worker
+    threads.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 clam_obj,
+                 workers=1):
+        """
+        Initialize the object and start its worker threads.
+
+        :param clam_obj: The Clam object that does the work.
+        :param workers: The number of jobs that may run at the same time.
+               Defaults to 1.
+
+        :return: Nothing.
+        """
+
+        assert type(workers) is int and workers > 0
+
+        self.clam_obj = clam_obj
+        self.jobs = list()
+
+        self._pending = queue.Queue()
+        self._threads = list()
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    # --------------------------------------------------------------------------
+    def _worker(self):
+        """
+        Runs jobs until shutdown puts None on the queue.
+
+        :return: Nothing.
+        """
+
+        while True:
+            job = self._pending.get()
+            if job is None:
+                return
+            job.run()
+
+    # --------------------------------------------------------------------------
+    def _submit(self,
+                job):
+        """
+        Adds a job to the queue.
+
+        :param job: The job.
+
+        :return: The job.
+        """
+
+        self.jobs.append(job)
+        self._pending.put(job)
+        return job
+
+    # --------------------------------------------------------------------------
+    def submit_gather(self,
+                      context,
+                      dest,
+                      callback=None):
+        """
+        Exports a context (on the calling thread) and queues the gather. Raises
+        a ClamError right away if the context cannot be exported.
+
+        :param context: The context we want to gather.
+        :param dest: The directory inside of which the context will be gathered.
+        :param callback: See Job. Defaults to None.
+
+        :return: The Job object.
+        """
+
+        name = context.get_name()
+        exported_p = self.clam_obj.export_context(context)
+
+        def work(job):
+            return self.clam_obj.gather_exported_context(exported_p=exported_p,
+                                                         name=name,
+                                                         dest=dest)
+
+        def cleanup(job):
+            remove_exported([exported_p])
+
+        return self._submit(Job("gather", name, work, callback, cleanup))
+
+    # --------------------------------------------------------------------------
+    def submit_publish(self,
+                       contexts,
+                       repo=None,
+                       workers=4,
+                       callback=None):
+        """
+        Validates the names of a batch of contexts and exports them (both on
+        the calling thread), then queues a single job that gathers and stores
+        all of them (see Clam.publish_exported).
+
+        :param contexts: A list of the contexts we want to publish.
+        :param repo: The repository to publish to. If None, then the default
+               repository will be used. Defaults to None.
+        :param workers: The number of contexts gathered at the same time.
+               Defaults to 4.
+        :param callback: See Job. Defaults to None.
+
+        :return: The Job object. Its result is the list of PublishResult
+                 objects (one per context), available right away: contexts
+                 with invalid names, or that could not be exported, have
+                 already failed. The rest are filled in as the job runs.
+        """
+
+        clam_obj = self.clam_obj
+
+        results, exports = clam_obj.export_for_publish(contexts, repo)
+        exports = list(exports)
+
+        def work(job):
+            clam_obj.publish_exported(
+                exports=exports,
+                repo=repo,
+                workers=workers,
+                total=len(contexts),
+                cancelled=lambda: job.cancel_requested)
+            return results
+
+        def cleanup(job):
+            remove_exported([exported_p for result, exported_p in exports])
+
+        name = ", ".join(context.get_name() for context in contexts)
+        job = Job("publish", name, work, callback, cleanup)
+        job.result = results
+
+        return self._submit(job)
+
+    # --------------------------------------------------------------------------
+    def active_jobs(self):
+        """
+        :return: A list of the jobs that are queued or running.
+        """
+
+        return [job for job in self.jobs if not job.done()]
+
+    # --------------------------------------------------------------------------
+    def shutdown(self,
+                 wait=True):
+        """
+        Stops the worker threads once the jobs already queued have run.
+
+        :param wait: If True, blocks until they have. Defaults to True.
+
+        :return: Nothing.
+        """
+
+        for thread in self._threads:
+            self._pending.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+# ------------------------------------------------------------------------------
+def remove_exported(exported_ps):
+    """
+    Deletes exported projects that were never gathered (i.e. because their job
+    was cancelled). Projects that are already gone are skipped.
+
+    :param exported_ps: A list of paths to exported projects.
+
+    :return: Nothing.
+    """
+
+    for exported_p in exported_ps:
+        if os.path.exists(exported_p):
+            os.remove(exported_p)
+
+
+# ------------------------------------------------------------------------------
+def get_queue(clam_obj):
+    """
+    Returns the process-wide job queue, creating it (bound to clam_obj) the
+    first time it is needed. Shelf tools use this so that jobs outlive the
+    script that submitted them.
+
+    :param clam_obj: The Clam object used if the queue has to be created.
+
+    :return: A JobQueue object.
+    """
+
+    global _queue
+
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(clam_obj)
+        return _queue
@@ -0,0 +1,263 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+MANIFEST_NAME = ".clam_manifest.json"
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+def hash_file(file_p):
+    """
+    Returns the sha1 hash of a file's contents.
+
+    :param file_p: The file to hash.
+
+    :return: The hash as a hex string.
+    """
+
+    hash_obj = hashlib.sha1()
+    with open(file_p, "rb") as f:
+        block = f.read(HASH_BLOCK_SIZE)
+        while block:
+            hash_obj.update(block)
+            block = f.read(HASH_BLOCK_SIZE)
+
+    return hash_obj.hexdigest()
+
+
+# ==============================================================================
+class Manifest(object):
+
+    """
+    A record, stored inside a gather directory, of every file that was gathered
+    into it: where it came from, how it was placed there (copied or linked),
+    and the size, mtime (and optionally the hash) the source had when it was
+    copied. Lets a later gather into the same
+    directory skip files that have not changed.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 gather_d):
+        """
+        Initialize the object, loading the existing manifest from the gather
+        directory if there is one.
+
+        :param gather_d: The gather directory.
+
+        :return: Nothing.
+        """
+
+        assert os.path.isdir(gather_d)
+
+        self.gather_d = gather_d
+        self.manifest_p = os.path.join(gather_d, MANIFEST_NAME)
+        self.entries = dict()
+
+        if os.path.exists(self.manifest_p):
+            try:
+                with open(self.manifest_p, "r") as f:
+                    self.entries = json.load(f)["files"]
+            except (IOError, ValueError, KeyError, TypeError):
+                self.entries = dict()
+
+    # --------------------------------------------------------------------------
+    def _key(self,
+             dest_p):
+        """
+        :param dest_p: The path of a gathered file.
+
+        :return: The key of that file in the manifest (its path relative to the
+                 gather directory).
+        """
+
+        return os.path.relpath(dest_p, self.gather_d)
+
+    # --------------------------------------------------------------------------
+    def is_current(self,
+                   source_p,
+                   dest_p,
+                   use_hash=False,
+                   link_mode="copy"):
+        """
+        Tests whether a gathered file is still an identical copy of its source,
+        i.e. it was gathered from the same source using the same link mode, the
+        source still has the same size and mtime (and hash, if use_hash is
+        True) it had back then, and the gathered copy is still there with the
+        same size. When copying, a gathered file that is a link (left by an
+        earlier gather that linked it) is never current, as editing it would
+        edit the source.
+
+        :param source_p: The path of the source file.
+        :param dest_p: The path the file is gathered to.
+        :param use_hash: If True, the source is also hashed and compared with
+               the recorded hash. Defaults to False.
+        :param link_mode: The link mode the file is being gathered with (see
+               copier.LINK_MODES). Defaults to "copy".
+
+        :return: True if the file does not need to be copied again.
+        """
+
+        entry = self.entries.get(self._key(dest_p))
+        if (entry is None or
+                entry.get("source") != source_p or
+                entry.get("link_mode") != link_mode):
+            return False
+
+        try:
+            source_stat = os.stat(source_p)
+            dest_stat = os.lstat(dest_p)
+        except OSError:
+            return False
+
+        if link_mode == "copy" and (os.path.islink(dest_p) or
+                                    dest_stat.st_nlink > 1):
+            return False
+
+        if (source_stat.st_size != entry.get("size") or
+                source_stat.st_mtime != entry.get("mtime") or
+                os.path.getsize(dest_p) != entry.get("size")):
+            return False
+
+        if use_hash:
+            if not entry.get("hash"):
+                return False
+            return hash_file(source_p) == entry["hash"]
+
+        return True
+
+    # --------------------------------------------------------------------------
+    def record(self,
+               source_p,
+               dest_p,
+               file_hash=None,
+               link_mode="copy"):
+        """
+        Records that a file has been gathered.
+
+        :param source_p: The path of the source file.
+        :param dest_p: The path the file was gathered to.
+        :param file_hash: The hash of the file's contents, if known. Defaults to
+               None.
+        :param link_mode: The link mode the file was gathered with (see
+               copier.LINK_MODES). Defaults to "copy".
+
+        :return: Nothing.
+        """
+
+        source_stat = os.stat(source_p)
+
+        self.entries[self._key(dest_p)] = {"source": source_p,
+                                           "size": source_stat.st_size,
+                                           "mtime": source_stat.st_mtime,
+                                           "hash": file_hash,
+                                           "link_mode": link_mode}
+
+    # --------------------------------------------------------------------------
+    def verify(self,
+               root_d):
+        """
+        Checks a copy of the gathered files (for example, the files as they
+        were stored by the publishing back end) against the hashes in this
+        manifest. Each file in the copy is read exactly once.
+
+        :param root_d: The directory holding the copy, laid out the same way as
+               the gather directory.
+
+        :return: A list of the manifest keys (paths relative to root_d) that
+                 are missing, have no recorded hash, or do not match.
+        """
+
+        failures = list()
+        for key in sorted(self.entries):
+            file_hash = self.entries[key].get("hash")
+            file_p = os.path.join(root_d, key)
+            if (not file_hash or
+                    not os.path.isfile(file_p) or
+                    hash_file(file_p) != file_hash):
+                failures.append(key)
+
+        return failures
+
+    # --------------------------------------------------------------------------
+    def find_copy(self,
+                  search_d):
+        """
+        Finds the directory, somewhere under search_d, that holds the most
+        recently written copy of this manifest (i.e. where the gathered files
+        were just copied to, along with their manifest). Earlier copies of the
+        same manifest (for example, an earlier version of an asset that was
+        published again unchanged) are ignored.
+
+        :param search_d: The directory to search.
+
+        :return: The directory containing the copy of the manifest, or None if
+                 no copy was found.
+        """
+
+        with open(self.manifest_p, "r") as f:
+            contents = f.read()
+
+        newest_d = None
+        newest_mtime = None
+        for dir_d, dir_names, file_names in os.walk(search_d):
+            if MANIFEST_NAME not in file_names:
+                continue
+            candidate_p = os.path.join(dir_d, MANIFEST_NAME)
+            if os.path.samefile(candidate_p, self.manifest_p):
+                continue
+            with open(candidate_p, "r") as f:
+                if f.read() != contents:
+                    continue
+            mtime = os.path.getmtime(candidate_p)
+            if newest_mtime is None or mtime > newest_mtime:
+                newest_d = dir_d
+                newest_mtime = mtime
+
+        return newest_d
+
+    # --------------------------------------------------------------------------
+    def save(self):
+        """
+        Writes the manifest into the gather directory (atomically, so an
+        interrupted gather never leaves a corrupt manifest behind).
+
+        :return: Nothing.
+        """
+
+        manifest_fd, temp_p = tempfile.mkstemp(prefix=MANIFEST_NAME + ".",
+                                               dir=self.gather_d)
+        try:
+            with os.fdopen(manifest_fd, "w") as f:
+                json.dump({"files": self.entries}, f, indent=1, sort_keys=True)
+            os.rename(temp_p, self.manifest_p)
+        except BaseException:
+            if os.path.exists(temp_p):
+                os.remove(temp_p)
+            raise
@@ -0,0 +1,336 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os.path
+
+from clamerror import ClamError
+import scanner
+
+
+# ==============================================================================
+class ProjectNode(object):
+
+    """
+    A single project in a ProjectGraph: the projects it references directly
+    and the non-project files it references directly (as resolved paths), and
+    how each of those was actually spelled in the project wherever the
+    spelling differs (i.e. $PDIR paths).
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 path):
+        """
+        Initialize the object.
+
+        :param path: The resolved path to the project.
+
+        :return: Nothing.
+        """
+
+        self.path = path
+        self.sub_projects = list()
+        self.references = list()
+        self.spellings = dict()
+
+    # --------------------------------------------------------------------------
+    def add_spelling(self,
+                     path,
+                     spelling):
+        """
+        Records how a referenced file was spelled in this project.
+
+        :param path: The resolved path to the file.
+        :param spelling: The path as written in the project.
+
+        :return: Nothing.
+        """
+
+        if spelling == path:
+            return
+        spellings = self.spellings.setdefault(path, list())
+        if spelling not in spellings:
+            spellings.append(spelling)
+
+
+# ==============================================================================
+class ProjectGraph(object):
+
+    """
+    The dependency graph of a set of clarisse projects. Every project is parsed
+    exactly once no matter how many parents reference it, keyed by its
+    absolute path after $PDIR has been resolved. Cycles are detected and
+    recorded instead of being followed forever.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 find_references=None,
+                 resc=None):
+        """
+        Initialize the object.
+
+        :param find_references: A function that accepts a path to a project and
+               returns an iterable of every file referenced in that project. If
+               None, the streaming scanner is used. Defaults to None.
+        :param resc: The resources object used to format error messages. Only
+               needed by topological_order. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        if find_references is None:
+            find_references = scanner.iter_file_references
+
+        self.find_references = find_references
+        self.resc = resc
+        self.nodes = dict()
+        self.cycles = list()
+
+    # --------------------------------------------------------------------------
+    def parse_project(self,
+                      project_p):
+        """
+        Parses a single project (without following its sub-projects) and adds it
+        to the graph. Does nothing if the project has already been parsed.
+
+        :param project_p: The resolved path to the project.
+
+        :return: The node for this project.
+        """
+
+        project_p = os.path.abspath(project_p)
+
+        if project_p in self.nodes:
+            return self.nodes[project_p]
+
+        # Only imported when needed, as libClarisse is slow to import
+        from libClarisse import libClarisse
+
+        node = ProjectNode(project_p)
+        self.nodes[project_p] = node
+
+        for file_p in self.find_references(project_p):
+            if file_p.endswith(".project"):
+                sub_project_p = os.path.abspath(
+                    libClarisse.pdir_to_path(file_p, project_p))
+                node.add_spelling(sub_project_p, file_p)
+                if sub_project_p not in node.sub_projects:
+                    node.sub_projects.append(sub_project_p)
+            else:
+                ref_p = file_p
+                if file_p.startswith("$PDIR"):
+                    ref_p = libClarisse.pdir_to_path(file_p, project_p)
+                ref_p = os.path.abspath(ref_p)
+                node.add_spelling(ref_p, file_p)
+                if ref_p not in node.references:
+                    node.references.append(ref_p)
+
+        return node
+
+    # --------------------------------------------------------------------------
+    def add_project(self,
+                    project_p):
+        """
+        Adds a project and, recursively, every project it references to the
+        graph. Projects already in the graph are not parsed again. Afterwards,
+        self.cycles lists every cycle in the graph.
+
+        :param project_p: The path to the project to add.
+
+        :return: The node for this project.
+        """
+
+        assert os.path.exists(project_p)
+        assert os.path.isfile(project_p)
+        assert os.path.splitext(project_p)[1] == ".project"
+
+        project_p = os.path.abspath(project_p)
+
+        pending = [project_p]
+        while pending:
+            current_p = pending.pop()
+            if current_p in self.nodes or not os.path.isfile(current_p):
+                continue
+            node = self.parse_project(current_p)
+            pending.extend(reversed(node.sub_projects))
+
+        self.update_cycles()
+
+        return self.nodes[project_p]
+
+    # --------------------------------------------------------------------------
+    def _children(self,
+                  project_p):
+        """
+        Returns the sub-projects of a project that are actually in the graph.
+
+        :param project_p: The project whose children we want.
+
+        :return: A list of paths.
+        """
+
+        return [sub_p for sub_p in self.nodes[project_p].sub_projects
+                if sub_p in self.nodes]
+
+    # --------------------------------------------------------------------------
+    def _find_cycles(self):
+        """
+        Walks the whole graph (iteratively, so deep hierarchies cannot exhaust
+        the stack) and returns every cycle found.
+
+        :return: A list of tuples, each of which lists the projects that make up
+                 one cycle, in reference order.
+        """
+
+        cycles = list()
+        in_progress = set()
+        finished = set()
+
+        for start_p in sorted(self.nodes):
+            if start_p in finished:
+                continue
+            stack = [(start_p, iter(self._children(start_p)))]
+            path = [start_p]
+            in_progress.add(start_p)
+            while stack:
+                project_p, children = stack[-1]
+                for child_p in children:
+                    if child_p in in_progress:
+                        cycles.append(tuple(path[path.index(child_p):]))
+                    elif child_p not in finished:
+                        stack.append((child_p, iter(self._children(child_p))))
+                        path.append(child_p)
+                        in_progress.add(child_p)
+                        break
+                else:
+                    stack.pop()
+                    path.pop()
+                    in_progress.discard(project_p)
+                    finished.add(project_p)
+
+        return cycles
+
+    # --------------------------------------------------------------------------
+    def update_cycles(self):
+        """
+        Finds every cycle in the graph and stores them in self.cycles. Only
+        needed after projects have been added with parse_project (add_project
+        does this itself).
+
+        :return: Nothing.
+        """
+
+        self.cycles = self._find_cycles()
+
+    # --------------------------------------------------------------------------
+    def sub_projects(self,
+                     project_p):
+        """
+        Returns every project referenced by the given project, directly or
+        indirectly, in depth-first order and without duplicates.
+
+        :param project_p: The project whose sub-projects we want.
+
+        :return: A list of paths to projects.
+        """
+
+        project_p = os.path.abspath(project_p)
+
+        output = list()
+        seen = set([project_p])
+        pending = list(reversed(self.nodes[project_p].sub_projects))
+        while pending:
+            sub_project_p = pending.pop()
+            if sub_project_p in seen:
+                continue
+            seen.add(sub_project_p)
+            output.append(sub_project_p)
+            if sub_project_p in self.nodes:
+                pending.extend(reversed(self.nodes[sub_project_p].sub_projects))
+
+        return output
+
+    # --------------------------------------------------------------------------
+    def references(self,
+                   project_p):
+        """
+        Returns every non-project file referenced by the given project or any of
+        its sub-projects, without duplicates.
+
+        :param project_p: The project whose references we want.
+
+        :return: A list of paths to files.
+        """
+
+        project_p = os.path.abspath(project_p)
+
+        output = list()
+        seen = set()
+        for node_p in [project_p] + self.sub_projects(project_p):
+            if node_p not in self.nodes:
+                continue
+            for file_p in self.nodes[node_p].references:
+                if file_p not in seen:
+                    seen.add(file_p)
+                    output.append(file_p)
+
+        return output
+
+    # --------------------------------------------------------------------------
+    def topological_order(self):
+        """
+        Returns every project in the graph ordered so that each project comes
+        after all of the projects it references. Raises a ClamError if the
+        graph contains a cycle.
+
+        :return: A list of paths to projects.
+        """
+
+        assert self.resc is not None
+
+        if self.cycles:
+            err = self.resc.error(106)
+            err.msg = err.msg.format(
+                cycle=" -> ".join(self.cycles[0] + self.cycles[0][:1]))
+            raise ClamError(err.msg, err.code)
+
+        output = list()
+        visited = set()
+        for start_p in sorted(self.nodes):
+            if start_p in visited:
+                continue
+            visited.add(start_p)
+            stack = [(start_p, iter(self._children(start_p)))]
+            while stack:
+                project_p, children = stack[-1]
+                for child_p in children:
+                    if child_p not in visited:
+                        visited.add(child_p)
+                        stack.append((child_p, iter(self._children(child_p))))
+                        break
+                else:
+                    stack.pop()
+                    output.append(project_p)
+
+        return output
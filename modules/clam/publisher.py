@@ -0,0 +1,74 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+# ==============================================================================
+class PublishResult(object):
+
+    """
+    The outcome of publishing a single context as part of a batch.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 name):
+        """
+        Initialize the object.
+
+        :param name: The name of the context (i.e. the asset name).
+
+        :return: Nothing.
+        """
+
+        self.name = name
+        self.gathered_d = None
+        self.published_parent_d = None
+        self.published = False
+        self.error = None
+        self.error_code = None
+
+    # --------------------------------------------------------------------------
+    @property
+    def success(self):
+        """
+        :return: True if the context was published without error.
+        """
+
+        return self.published and self.error is None
+
+    # --------------------------------------------------------------------------
+    def fail(self,
+             message,
+             code=0):
+        """
+        Records why this context could not be published.
+
+        :param message: The error message.
+        :param code: The error code. Defaults to 0.
+
+        :return: Nothing.
+        """
+
+        self.published = False
+        self.error = message
+        self.error_code = code
@@ -0,0 +1,242 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+DB_NAME = "clam_refs.sqlite"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+def _to_str(text):
+    """
+    sqlite hands back unicode objects under python 2. The rest of clam works
+    with native strings, so convert back.
+
+    :param text: The text returned from the database.
+
+    :return: The text as a native string.
+    """
+
+    if not isinstance(text, str):
+        return text.encode("utf-8")
+    return text
+
+
+# ==============================================================================
+class RefIndex(object):
+
+    """
+    A persistent, on-disk index of the quoted strings found in clarisse
+    projects. Entries are keyed by the project's path, mtime and size (and
+    optionally a hash of its contents), so a project is only ever re-scanned
+    after it has changed. The index is a sqlite database, which makes it safe to
+    share between several clarisse sessions at once. The least recently used
+    entries are evicted once the index holds more than max_entries projects.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 cache_d,
+                 max_entries=100000,
+                 use_hash=False):
+        """
+        Initialize the object.
+
+        :param cache_d: The directory in which the index is stored. Will be
+               created if it does not exist.
+        :param max_entries: The maximum number of projects held in the index.
+               Defaults to 100000.
+        :param use_hash: If True, the contents of each project are hashed and
+               the hash becomes part of the key. This is slower, but catches
+               edits that preserve both the size and mtime. Defaults to False.
+
+        :return: Nothing.
+        """
+
+        assert type(cache_d) is str and cache_d
+        assert type(max_entries) is int and max_entries > 0
+        assert type(use_hash) is bool
+
+        if not os.path.exists(cache_d):
+            try:
+                os.makedirs(cache_d)
+            except OSError:
+                if not os.path.isdir(cache_d):
+                    raise
+
+        self.db_p = os.path.join(cache_d, DB_NAME)
+        self.max_entries = max_entries
+        self.use_hash = use_hash
+
+        self.hits = 0
+        self.misses = 0
+
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS projects ("
+                         "path TEXT PRIMARY KEY, "
+                         "mtime REAL, "
+                         "size INTEGER, "
+                         "hash TEXT, "
+                         "refs TEXT, "
+                         "last_used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_last_used "
+                         "ON projects (last_used)")
+
+    # --------------------------------------------------------------------------
+    def _connection(self):
+        """
+        sqlite connections may not be shared between threads, so every thread
+        gets its own connection to the index.
+
+        :return: A sqlite connection.
+        """
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_p, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    # --------------------------------------------------------------------------
+    def _key(self,
+             project_p):
+        """
+        Builds the key for a project from its current state on disk.
+
+        :param project_p: The path to the project.
+
+        :return: A tuple of (path, mtime, size, hash). The hash is an empty
+                 string unless use_hash is True.
+        """
+
+        stat_result = os.stat(project_p)
+
+        content_hash = ""
+        if self.use_hash:
+            hash_obj = hashlib.sha1()
+            with open(project_p, "rb") as f:
+                block = f.read(HASH_BLOCK_SIZE)
+                while block:
+                    hash_obj.update(block)
+                    block = f.read(HASH_BLOCK_SIZE)
+            content_hash = hash_obj.hexdigest()
+
+        return (os.path.abspath(project_p),
+                stat_result.st_mtime,
+                stat_result.st_size,
+                content_hash)
+
+    # --------------------------------------------------------------------------
+    def _count(self,
+               hit):
+        """
+        Increments the hit or miss counter.
+
+        :param hit: If True, count a hit. Otherwise count a miss.
+
+        :return: Nothing.
+        """
+
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # --------------------------------------------------------------------------
+    def quoted_strings(self,
+                       project_p,
+                       scan):
+        """
+        Returns the quoted strings in a project, either from the index (if the
+        project has not changed since it was indexed) or by scanning it (in
+        which case the index is updated). A broken or locked index never stops
+        a scan: the project is simply scanned instead.
+
+        :param project_p: The path to the project.
+        :param scan: A function that accepts the path to a project and returns
+               an iterable of all the quoted strings in that project.
+
+        :return: A list of strings.
+        """
+
+        path, mtime, size, content_hash = self._key(project_p)
+
+        try:
+            with self._connection() as conn:
+                row = conn.execute("SELECT refs FROM projects WHERE path=? AND "
+                                   "mtime=? AND size=? AND hash=?",
+                                   (path, mtime, size, content_hash)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE projects SET last_used=? WHERE path=?",
+                                 (time.time(), path))
+        except sqlite3.Error:
+            row = None
+
+        if row is not None:
+            self._count(True)
+            if not row[0]:
+                return list()
+            return [_to_str(ref) for ref in row[0].split("\n")]
+
+        self._count(False)
+
+        refs = list(scan(project_p))
+
+        try:
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO projects VALUES "
+                             "(?, ?, ?, ?, ?, ?)",
+                             (path, mtime, size, content_hash, "\n".join(refs),
+                              time.time()))
+                conn.execute("DELETE FROM projects WHERE path IN ("
+                             "SELECT path FROM projects "
+                             "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                             (self.max_entries,))
+        except sqlite3.Error:
+            pass
+
+        return refs
+
+    # --------------------------------------------------------------------------
+    def clear(self):
+        """
+        Removes every entry from the index and resets the hit and miss counters.
+
+        :return: Nothing.
+        """
+
+        with self._connection() as conn:
+            conn.execute("DELETE FROM projects")
+
+        self.hits = 0
+        self.misses = 0
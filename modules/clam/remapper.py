@@ -0,0 +1,208 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os.path
+import re
+
+
+# ------------------------------------------------------------------------------
+def _node_to_regex(node):
+    """
+    Converts one node of a character trie into a regular expression. Chains of
+    nodes with a single child are collapsed into one literal, so the nesting
+    depth of the expression only grows with the number of branch points (not
+    with the length of the paths).
+
+    :param node: A dictionary mapping each next character to its child node.
+           An empty string key marks the end of a complete path.
+
+    :return: A regular expression string.
+    """
+
+    terminal = "" in node
+
+    branches = list()
+    for char in sorted(node):
+        if not char:
+            continue
+        literal = char
+        child = node[char]
+        while len(child) == 1 and "" not in child:
+            next_char = list(child)[0]
+            literal += next_char
+            child = child[next_char]
+        branches.append(re.escape(literal) + _node_to_regex(child))
+
+    if not branches:
+        return ""
+
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    # Greedy optional group: longer paths are always tried before the path
+    # that ends at this node.
+    regex = "(?:" + "|".join(branches) + ")"
+    if terminal:
+        regex += "?"
+    return regex
+
+
+# ------------------------------------------------------------------------------
+def build_pattern(keys):
+    """
+    Builds a single compiled regular expression that matches any of the given
+    strings, always preferring the longest string when one is a prefix of
+    another. The expression is structured as a trie so that matching does not
+    have to try each key in turn.
+
+    :param keys: An iterable of literal strings.
+
+    :return: A compiled regular expression, or None if there are no keys.
+    """
+
+    trie = dict()
+    for key in keys:
+        if not key:
+            continue
+        node = trie
+        for char in key:
+            node = node.setdefault(char, dict())
+        node[""] = True
+
+    if not trie:
+        return None
+
+    return re.compile(_node_to_regex(trie))
+
+
+# ==============================================================================
+class PathRewriter(object):
+
+    """
+    Rewrites the paths in a clarisse project in a single pass per line. All of
+    the remapped paths are compiled into one matcher, and the replacement for
+    each path (made $PDIR relative if requested) is computed once up front.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 remapped,
+                 project_p,
+                 relative=True,
+                 pattern=None,
+                 local_remapped=None):
+        """
+        Initialize the object.
+
+        :param remapped: The dictionary where the key is the original path that
+               would be found in a project file, and the value is the path of
+               where this file has been gathered to.
+        :param project_p: The path to the project that will be rewritten.
+        :param relative: If True, then the new paths will be made relative to
+               the project being rewritten. Defaults to True.
+        :param pattern: An already compiled matcher (from build_pattern) for
+               the keys of remapped. Lets several projects that share the same
+               remapped dictionary skip compiling it again. If None, it is
+               built here. Defaults to None.
+        :param local_remapped: An optional dictionary like remapped, holding
+               paths that only appear in this project (i.e. its $PDIR paths).
+               These get a small matcher of their own, so that the shared
+               pattern does not have to be compiled again for this project.
+               Defaults to None.
+
+        :return: Nothing.
+        """
+
+        assert type(remapped) is dict
+        assert type(relative) is bool
+        assert local_remapped is None or type(local_remapped) is dict
+
+        project_parent_d = os.path.split(project_p)[0]
+
+        def target(dest_p):
+            if relative:
+                rel_path = os.path.relpath(dest_p, project_parent_d)
+                return os.path.join("$PDIR", rel_path)
+            return dest_p
+
+        self.targets = dict()
+        for key in remapped:
+            self.targets[key] = target(remapped[key])
+
+        if pattern is None:
+            pattern = build_pattern(self.targets)
+        self.pattern = pattern
+
+        self.local_pattern = None
+        if local_remapped:
+            for key in local_remapped:
+                self.targets[key] = target(local_remapped[key])
+            self.local_pattern = build_pattern(local_remapped)
+
+    # --------------------------------------------------------------------------
+    def _replacement(self,
+                     match):
+        """
+        Returns the new path for a matched original path.
+
+        :param match: The regular expression match object.
+
+        :return: The replacement string.
+        """
+
+        return self.targets[match.group(0)]
+
+    # --------------------------------------------------------------------------
+    def rewrite(self,
+                line):
+        """
+        Replaces every remapped path in a line of text.
+
+        :param line: The line to rewrite.
+
+        :return: The rewritten line.
+        """
+
+        if self.local_pattern is not None:
+            line = self.local_pattern.sub(self._replacement, line)
+
+        if self.pattern is None:
+            return line
+
+        return self.pattern.sub(self._replacement, line)
+
+    # --------------------------------------------------------------------------
+    def matches(self,
+                line):
+        """
+        Tests whether a line of text contains any remapped path.
+
+        :param line: The line to test.
+
+        :return: True if the line would be changed by rewrite.
+        """
+
+        for pattern in (self.local_pattern, self.pattern):
+            if pattern is not None and pattern.search(line) is not None:
+                return True
+        return False
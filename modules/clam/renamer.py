@@ -0,0 +1,223 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import re
+
+try:
+    import ix
+except ImportError:
+    ix = None
+
+from clamerror import ClamError
+
+
+MULTIPLE_UNDERSCORES = re.compile(r"_{2,}")
+
+
+# ------------------------------------------------------------------------------
+def camel_to_snake(text):
+    """
+    Converts camel case to lower case words separated by underscores, exactly
+    the way the original renaming script did: every character that is not
+    lower case (capitals, digits, underscores) gets an underscore in front of
+    it ("car2Door" -> "car_2_door", "HDRIMap" -> "_h_d_r_i_map"). Names that
+    have already been renamed depend on this, so it must not change.
+
+    :param text: The text to convert.
+
+    :return: The converted text.
+    """
+
+    return "".join("_" + char.lower() if char == char.upper() else char.lower()
+                   for char in text)
+
+
+# ------------------------------------------------------------------------------
+def new_asset_name(name):
+    """
+    Converts a legacy asset name (type_category_camelCaseDescription_variant)
+    to the current convention (type_category_snake_case_description_VARIANT).
+    Raises a ValueError if the name does not have that structure.
+
+    :param name: The legacy asset name.
+
+    :return: The new name.
+    """
+
+    try:
+        base, variant = name.rsplit("_", 1)
+        type_name, cat, desc = base.split("_", 2)
+    except ValueError:
+        raise ValueError("Asset name " + name + " is not of the form "
+                         "type_category_description_variant")
+
+    new_name = "_".join((type_name, cat, camel_to_snake(desc), variant.upper()))
+
+    return MULTIPLE_UNDERSCORES.sub("_", new_name)
+
+
+# ==============================================================================
+class AssetRename(object):
+
+    """
+    Everything that has to change to rename a single legacy asset. Built by
+    reading the scene, without changing anything.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 asset):
+        """
+        Initialize the object by inspecting the asset. Raises a ClamError if
+        the asset does not have the expected structure.
+
+        :param asset: The asset context.
+
+        :return: Nothing.
+        """
+
+        from libClarisse import libClarisse
+
+        self.asset_url = asset.get_full_name()
+        self.old_name = asset.get_name()
+
+        try:
+            self.new_name = new_asset_name(self.old_name)
+        except ValueError as e:
+            raise ClamError(str(e), 0)
+
+        old_name = self.old_name
+        new_name = self.new_name
+
+        # Pairs of (url of the item, its new name). The asset itself is renamed
+        # separately, after everything inside it.
+        self.renames = [
+            (self.asset_url + "/" + old_name + "_OUT", new_name + "_var1_OUT"),
+            (self.asset_url + "/" + old_name + "_sl", new_name + "_sl"),
+            (self.asset_url + "/shading/shaders/" + old_name + "_MAT",
+             new_name + "_MAT")]
+
+        geo_ctx = asset.get_context("geo")
+        geo_url = geo_ctx.get_full_name()
+
+        abc_item = None
+        if geo_ctx.get_context_count() == 1:
+            abc_item = geo_ctx.get_context(0)
+        else:
+            for i in range(geo_ctx.get_object_count()):
+                if geo_ctx.get_item(i).get_name() != "geo_gr":
+                    abc_item = geo_ctx.get_item(i)
+                    break
+        if abc_item is None:
+            raise ClamError("Unable to find the geometry of asset " +
+                            self.asset_url, 0)
+
+        self.renames.append((abc_item.get_full_name(), new_name + "_abc"))
+
+        # The geometry (after renaming) and its group move into a var1 context
+        self.var_url = geo_url + "/var1"
+        self.moves = [geo_url + "/" + new_name + "_abc",
+                      geo_url + "/geo_gr"]
+
+        # The shading layer filters, rewritten to use the new name
+        self.sl_url = self.asset_url + "/" + new_name + "_sl"
+        sl = ix.get_item(self.asset_url + "/" + old_name + "_sl")
+        attr = libClarisse.get_attribute_obj(sl, "shading_layer_filters")
+        values = libClarisse.get_all_attribute_values(attr)
+        self.filters = [old_filter.replace(old_name, new_name) for
+                        old_filter in values]
+
+
+# ------------------------------------------------------------------------------
+def plan_renames(assets):
+    """
+    Works out every change needed to rename a list of legacy assets, before
+    anything is changed. Raises a ClamError if any asset cannot be renamed, or
+    if two assets would end up with the same name.
+
+    :param assets: A list of asset contexts.
+
+    :return: A list of AssetRename objects (assets whose name does not change
+             are left out).
+    """
+
+    renames = list()
+    new_urls = dict()
+    for asset in assets:
+        rename = AssetRename(asset)
+        if rename.new_name == rename.old_name:
+            continue
+
+        parent_url = rename.asset_url.rsplit("/", 1)[0]
+        new_url = parent_url + "/" + rename.new_name
+        if new_url in new_urls:
+            raise ClamError("Assets " + new_urls[new_url] + " and " +
+                            rename.asset_url + " would both be renamed to " +
+                            new_url, 0)
+        new_urls[new_url] = rename.asset_url
+
+        renames.append(rename)
+
+    return renames
+
+
+# ------------------------------------------------------------------------------
+def apply_renames(renames,
+                  batch_name="clam rename assets"):
+    """
+    Applies a list of renames in a single clarisse command batch (one undo
+    step). Each shading layer's filters are rewritten with a single command,
+    and each asset's geometry is moved with a single command. The assets
+    themselves are renamed last, so every url planned beforehand stays valid
+    until then.
+
+    :param renames: A list of AssetRename objects (see plan_renames).
+    :param batch_name: The name of the command batch (shown in clarisse's
+           undo history). Defaults to "clam rename assets".
+
+    :return: Nothing.
+    """
+
+    from libClarisse import libClarisse
+
+    ix.begin_command_batch(batch_name)
+    try:
+        for rename in renames:
+            for item_url, new_item_name in rename.renames:
+                ix.cmds.RenameItem(item_url, new_item_name)
+
+        for rename in renames:
+            libClarisse.create_context(rename.var_url)
+            ix.cmds.MoveItemsTo(rename.moves, rename.var_url)
+
+            if rename.filters:
+                ix.cmds.SetShadingLayerRulesProperty(
+                    rename.sl_url,
+                    list(range(len(rename.filters))),
+                    "filter",
+                    rename.filters)
+
+        for rename in renames:
+            ix.cmds.RenameItem(rename.asset_url, rename.new_name)
+    finally:
+        ix.end_command_batch()
@@ -0,0 +1,149 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os.path
+import threading
+
+
+# ==============================================================================
+class RepoMembership(object):
+
+    """
+    Answers "which of these files are already inside a repo?" for large batches
+    of files while asking the librarian as rarely as possible.
+
+    A repo is a directory tree, so every file in the same directory has the
+    same answer, and every directory beneath a directory that is inside a repo
+    is inside that repo too. The librarian is therefore only asked about one
+    file per directory, the directories are visited in sorted order so that
+    parents are answered before their children, and every answer is cached
+    (per set of repos) across calls.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Initialize the object.
+
+        :return: Nothing.
+        """
+
+        self.cache = dict()
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _repos_key(repo_names):
+        """
+        :param repo_names: A list of repo names, or None for all repos.
+
+        :return: A hashable key for that set of repos.
+        """
+
+        if not repo_names:
+            return None
+        return tuple(sorted(repo_names))
+
+    # --------------------------------------------------------------------------
+    def _inherited(self,
+                   repos_key,
+                   dir_d):
+        """
+        Tests whether any (already answered) parent of a directory is inside a
+        repo.
+
+        :param repos_key: The key of the set of repos.
+        :param dir_d: The directory.
+
+        :return: True if a parent is known to be inside a repo.
+        """
+
+        parent_d = os.path.dirname(dir_d)
+        while parent_d and parent_d != dir_d:
+            if self.cache.get((repos_key, parent_d)):
+                return True
+            dir_d = parent_d
+            parent_d = os.path.dirname(dir_d)
+
+        return False
+
+    # --------------------------------------------------------------------------
+    def files_within_repos(self,
+                           files,
+                           librarian_obj,
+                           repo_names=None):
+        """
+        Returns the files that are inside a repo.
+
+        :param files: A list of absolute paths to files.
+        :param librarian_obj: The librarian to ask about directories whose
+               answer is not known yet.
+        :param repo_names: A list of repos to check. If None, then all repos
+               are checked. Defaults to None.
+
+        :return: A list of the files (from files) that are inside one of the
+                 repos.
+        """
+
+        repos_key = self._repos_key(repo_names)
+
+        dirs = [os.path.dirname(file_p) for file_p in files]
+
+        # One representative file per directory
+        representatives = dict()
+        for dir_d, file_p in zip(dirs, files):
+            if dir_d not in representatives:
+                representatives[dir_d] = file_p
+
+        with self._lock:
+            for dir_d in sorted(representatives):
+                key = (repos_key, dir_d)
+                if key in self.cache:
+                    continue
+                if self._inherited(repos_key, dir_d):
+                    self.cache[key] = True
+                    continue
+                self.queries += 1
+                self.cache[key] = bool(librarian_obj.file_is_within_repo(
+                    representatives[dir_d],
+                    repo_names or None,
+                    not repo_names))
+
+            within = set(dir_d for dir_d in representatives
+                         if self.cache[(repos_key, dir_d)])
+
+        return [file_p for dir_d, file_p in zip(dirs, files)
+                if dir_d in within]
+
+    # --------------------------------------------------------------------------
+    def clear(self):
+        """
+        Forgets every cached answer (for example after a repo has been added or
+        moved).
+
+        :return: Nothing.
+        """
+
+        with self._lock:
+            self.cache = dict()
@@ -0,0 +1,158 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os.path
+import re
+
+import sequences
+
+
+FILE_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+PREFERENCES_TAG = "#preferences"
+
+
+# ------------------------------------------------------------------------------
+def iter_quoted_strings(project_p):
+    """
+    Given a path to a clarisse project, stream that project's text file and
+    yield every quoted string found before the #preferences section. The file
+    is read one buffered line at a time (never as a whole), lines that cannot
+    contain a quoted string are skipped without running the regex, and reading
+    stops as soon as the #preferences section is reached.
+
+    :param project_p: The path to the project we are scanning.
+
+    :return: A generator yielding each quoted string (without its quotes) in
+             the order it appears in the project.
+    """
+
+    assert os.path.exists(project_p)
+    assert os.path.isfile(project_p)
+    assert os.path.splitext(project_p)[1] == ".project"
+
+    with open(project_p, "r") as f:
+        for line in f:
+
+            stripped = line.lstrip()
+
+            if stripped.startswith("#"):
+                if stripped[:len(PREFERENCES_TAG)].lower() == PREFERENCES_TAG:
+                    break
+
+            if '"' not in stripped:
+                continue
+
+            for match in FILE_PATTERN.finditer(stripped):
+                yield match.group(0).strip('"')
+
+
+# ------------------------------------------------------------------------------
+def iter_file_references(project_p,
+                         is_file=os.path.isfile):
+    """
+    Given a path to a clarisse project, lazily yield every quoted string in
+    that project that points to an existing file on disk.
+
+    :param project_p: The path to the project we are scanning.
+    :param is_file: A function that accepts a path and returns True if that
+           path is an existing file. Defaults to os.path.isfile.
+
+    :return: A generator yielding each referenced file in the order it appears
+             in the project.
+    """
+
+    for file_name in iter_quoted_strings(project_p):
+        if is_file(file_name):
+            yield file_name
+
+
+# ------------------------------------------------------------------------------
+def looks_like_file_path(quoted_string):
+    """
+    Tests whether a quoted string from a project looks like the absolute path
+    to a file (whether or not that file exists). Used to find references to
+    files that are missing, which cannot be told apart from any other quoted
+    string by testing whether they exist on disk.
+
+    :param quoted_string: A quoted string (without its quotes).
+
+    :return: True if the string looks like a path to a file.
+    """
+
+    if "://" in quoted_string or "\n" in quoted_string:
+        return False
+    if not os.path.isabs(quoted_string):
+        return False
+    return bool(os.path.splitext(quoted_string)[1])
+
+
+# ------------------------------------------------------------------------------
+def resolve_pdir_paths(quoted_strings,
+                       project_p):
+    """
+    Resolves every $PDIR path in a list of quoted strings from a project.
+
+    :param quoted_strings: A list of quoted strings (without their quotes).
+    :param project_p: The path to the project they came from.
+
+    :return: A list of the same length as quoted_strings, where each $PDIR path
+             has been replaced by the path it points to.
+    """
+
+    if not any(quoted_string.startswith("$PDIR") for
+               quoted_string in quoted_strings):
+        return list(quoted_strings)
+
+    # Only imported when needed, as libClarisse is slow to import
+    from libClarisse import libClarisse
+
+    return [libClarisse.pdir_to_path(quoted_string, project_p)
+            if quoted_string.startswith("$PDIR") else quoted_string
+            for quoted_string in quoted_strings]
+
+
+# ------------------------------------------------------------------------------
+def is_reference(path,
+                 is_file=os.path.isfile,
+                 listdir=None):
+    """
+    Tests whether a (resolved) quoted string from a project refers to files
+    that exist: either an existing file, or a path with a frame or tile token
+    (<UDIM>, #### or $F4) that matches at least one file.
+
+    :param path: The quoted string, with any $PDIR already resolved.
+    :param is_file: A function that accepts a path and returns True if that
+           path is an existing file. Defaults to os.path.isfile.
+    :param listdir: A function used to list directories when matching
+           sequences (see sequences.find_sequence). If None, os.listdir is
+           used. Defaults to None.
+
+    :return: True if the path refers to existing files.
+    """
+
+    if is_file(path):
+        return True
+
+    return (sequences.has_token(path) and
+            looks_like_file_path(path) and
+            sequences.find_sequence(path, listdir) is not None)
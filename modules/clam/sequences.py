@@ -0,0 +1,239 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+
+
+# The frame (or tile) tokens that may appear in the file name of a reference:
+# <UDIM> (a four digit tile number from 1001), a run of # (one # per digit of
+# padding) or $F followed by an optional padding (e.g. $F4).
+TOKEN_PATTERN = re.compile(r"<UDIM>|#+|\$F(\d*)")
+UDIM_TOKEN = "<UDIM>"
+FIRST_UDIM = 1001
+
+
+# ------------------------------------------------------------------------------
+def has_token(path):
+    """
+    Tests whether the file name of a path contains a frame or tile token.
+
+    :param path: The path to test.
+
+    :return: True if the file name contains a token.
+    """
+
+    return TOKEN_PATTERN.search(os.path.basename(path)) is not None
+
+
+# ------------------------------------------------------------------------------
+def _listdir(dir_d):
+    """
+    os.listdir that returns an empty list for directories that cannot be read.
+
+    :param dir_d: The directory to list.
+
+    :return: A list of the names in the directory.
+    """
+
+    try:
+        return os.listdir(dir_d)
+    except (OSError, ValueError):
+        return list()
+
+
+# ==============================================================================
+class FileSequence(object):
+
+    """
+    A reference to many files at once (the tiles of a UDIM texture or the frames
+    of a cache), held as the path with its token plus the set of frames that
+    exist on disk, instead of as one path per file.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 pattern,
+                 frames):
+        """
+        Initialize the object. Raises a ValueError if the file name of the
+        pattern does not contain exactly one token.
+
+        :param pattern: The path, with a token in its file name (e.g.
+               /textures/wall.<UDIM>.exr).
+        :param frames: An iterable of the frame (or tile) numbers.
+
+        :return: Nothing.
+        """
+
+        dir_d, file_n = os.path.split(pattern)
+
+        matches = list(TOKEN_PATTERN.finditer(file_n))
+        if len(matches) != 1:
+            raise ValueError("Expected a single frame token in " + pattern)
+        match = matches[0]
+
+        self.pattern = pattern
+        self.frames = tuple(sorted(set(frames)))
+        self.token = match.group(0)
+
+        if self.token == UDIM_TOKEN:
+            self.padding = 4
+        elif self.token.startswith("#"):
+            self.padding = len(self.token)
+        else:
+            self.padding = int(match.group(1) or 1)
+
+        self._prefix = os.path.join(dir_d, file_n[:match.start()])
+        self._suffix = file_n[match.end():]
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        """
+        :return: The number of files in the sequence.
+        """
+
+        return len(self.frames)
+
+    # --------------------------------------------------------------------------
+    def frame_string(self,
+                     frame):
+        """
+        :param frame: A frame (or tile) number.
+
+        :return: The frame number as it appears in a file name.
+        """
+
+        return str(frame).zfill(self.padding)
+
+    # --------------------------------------------------------------------------
+    def path(self,
+             frame):
+        """
+        :param frame: A frame (or tile) number.
+
+        :return: The path to the file of that frame.
+        """
+
+        return self._prefix + self.frame_string(frame) + self._suffix
+
+    # --------------------------------------------------------------------------
+    def paths(self):
+        """
+        :return: A generator yielding the path to each file in the sequence, in
+                 frame order.
+        """
+
+        return (self.path(frame) for frame in self.frames)
+
+    # --------------------------------------------------------------------------
+    def moved(self,
+              first_dest_p):
+        """
+        Returns where the sequence goes when its first file is moved (and
+        possibly renamed, i.e. to avoid a clash) to first_dest_p. Raises a
+        ValueError if the new name of the first file does not end with its
+        frame number followed by the rest of the original file name (so there
+        is no telling where the token goes).
+
+        :param first_dest_p: The new path of the first file in the sequence.
+
+        :return: A FileSequence with the same frames, whose first file is
+                 first_dest_p.
+        """
+
+        tail = self.frame_string(self.frames[0]) + self._suffix
+        if not os.path.basename(first_dest_p).endswith(tail):
+            raise ValueError("Expected " + first_dest_p + " to end with " +
+                             tail)
+
+        return FileSequence(first_dest_p[:-len(tail)] + self.token +
+                            self._suffix, self.frames)
+
+    # --------------------------------------------------------------------------
+    def match_frame(self,
+                    file_n):
+        """
+        Tests whether a file name belongs to this sequence.
+
+        :param file_n: The file name (without its directory).
+
+        :return: The frame number, or None if the file is not part of the
+                 sequence.
+        """
+
+        prefix_n = os.path.basename(self._prefix)
+        if not (file_n.startswith(prefix_n) and file_n.endswith(self._suffix)):
+            return None
+
+        digits = file_n[len(prefix_n):len(file_n) - len(self._suffix)]
+        if not digits.isdigit():
+            return None
+
+        frame = int(digits)
+        if self.token == UDIM_TOKEN and (frame < FIRST_UDIM or
+                                         len(digits) != self.padding):
+            return None
+
+        # Only accept the padding the token asks for (so "#" does not match
+        # "0001", and "####" does not match "1")
+        if self.frame_string(frame) != digits:
+            return None
+
+        return frame
+
+
+# ------------------------------------------------------------------------------
+def find_sequence(pattern,
+                  listdir=None):
+    """
+    Finds every file on disk that matches a path with a frame or tile token. The
+    directory is listed once, instead of testing each possible frame.
+
+    :param pattern: The path, with a token in its file name.
+    :param listdir: A function that accepts a directory and returns the names in
+           it (i.e. StatCache.listdir, so that each directory is only listed
+           once per gather). If None, os.listdir is used. Defaults to None.
+
+    :return: A FileSequence, or None if the path does not have exactly one
+             token, or no files match it.
+    """
+
+    try:
+        sequence = FileSequence(pattern, list())
+    except ValueError:
+        return None
+
+    if listdir is None:
+        listdir = _listdir
+
+    frames = list()
+    for file_n in listdir(os.path.dirname(pattern)):
+        frame = sequence.match_frame(file_n)
+        if frame is not None:
+            frames.append(frame)
+
+    if not frames:
+        return None
+
+    return FileSequence(pattern, frames)
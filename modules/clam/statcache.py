@@ -0,0 +1,185 @@
+#! /usr/bin/env python2
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import stat
+import threading
+import time
+
+
+# ==============================================================================
+class StatCache(object):
+
+    """
+    Memoizes os.stat calls so that every unique path is only stat'ed once,
+    however many projects reference it. On high latency file systems (NFS) the
+    stats for a batch of paths can be issued in parallel from a pool of
+    threads. Keeps a count of the stat calls actually issued and the total time
+    spent in them. Directory listings (used to expand image sequences) are
+    memoized the same way.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 workers=0):
+        """
+        Initialize the object.
+
+        :param workers: The number of threads used by prefetch. If 0 or 1, the
+               stats are issued serially. Defaults to 0.
+
+        :return: Nothing.
+        """
+
+        assert type(workers) is int and workers >= 0
+
+        self.workers = workers
+
+        self.stat_count = 0
+        self.stat_time = 0.0
+
+        self.listdir_count = 0
+
+        self._results = dict()
+        self._listings = dict()
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+    def _do_stat(self,
+                 path):
+        """
+        Issues a single stat call and records it.
+
+        :param path: The path to stat.
+
+        :return: The os.stat result, or None if the path does not exist.
+        """
+
+        start = time.time()
+        try:
+            result = os.stat(path)
+        except (OSError, ValueError):
+            result = None
+        elapsed = time.time() - start
+
+        with self._lock:
+            self.stat_count += 1
+            self.stat_time += elapsed
+            self._results[path] = result
+
+        return result
+
+    # --------------------------------------------------------------------------
+    def stat(self,
+             path):
+        """
+        Returns the (memoized) os.stat result for a path.
+
+        :param path: The path to stat.
+
+        :return: The os.stat result, or None if the path does not exist.
+        """
+
+        try:
+            return self._results[path]
+        except KeyError:
+            return self._do_stat(path)
+
+    # --------------------------------------------------------------------------
+    def is_file(self,
+                path):
+        """
+        Equivalent to os.path.isfile, but costs at most one stat per path for
+        the lifetime of this object.
+
+        :param path: The path to test.
+
+        :return: True if the path exists and is a regular file.
+        """
+
+        result = self.stat(path)
+        return result is not None and stat.S_ISREG(result.st_mode)
+
+    # --------------------------------------------------------------------------
+    def listdir(self,
+                dir_d):
+        """
+        Returns the (memoized) contents of a directory.
+
+        :param dir_d: The directory to list.
+
+        :return: A list of the names in the directory, or an empty list if it
+                 cannot be listed.
+        """
+
+        try:
+            return self._listings[dir_d]
+        except KeyError:
+            pass
+
+        start = time.time()
+        try:
+            result = os.listdir(dir_d)
+        except (OSError, ValueError):
+            result = list()
+        elapsed = time.time() - start
+
+        with self._lock:
+            self.listdir_count += 1
+            self.stat_time += elapsed
+            self._listings[dir_d] = result
+
+        return result
+
+    # --------------------------------------------------------------------------
+    def prefetch(self,
+                 paths):
+        """
+        Stats every path that is not already cached. If this object was created
+        with more than one worker, the stats are issued in parallel.
+
+        :param paths: An iterable of paths.
+
+        :return: Nothing.
+        """
+
+        pending = list()
+        seen = set()
+        for path in paths:
+            if path not in self._results and path not in seen:
+                seen.add(path)
+                pending.append(path)
+
+        if self.workers < 2 or len(pending) < 2:
+            for path in pending:
+                self._do_stat(path)
+            return
+
+        # Imported here as multiprocessing is slow to import
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(self.workers, len(pending)))
+        try:
+            pool.map(self._do_stat, pending)
+        finally:
+            pool.close()
+            pool.join()
@@ -19,7 +19,7 @@ def do_it():
     else:
         language = "english"
 
-    clam_obj = clam.Clam(language)
+    clam_obj = clam.get_clam(language)
 
     if not libClarisse.save_snapshot():
         title = clam_obj.resc.message("error")
@@ -13,7 +13,7 @@ def do_it():
     else:
         language = "english"
 
-    clam_obj = clam.Clam(language)
+    clam_obj = clam.get_clam(language)
     contexts = libClarisse.selection_to_context_list()
 
     if contexts:
@@ -1,6 +1,7 @@
 import os
 
 from clam import clam
+from clam import jobqueue
 from clam.clamerror import ClamError
 
 from libClarisse import libClarisse
@@ -14,21 +15,34 @@ def do_it():
     else:
         language = "english"
 
-    clam_obj = clam.Clam(language)
+    clam_obj = clam.get_clam(language)
     contexts = libClarisse.selection_to_context_list()
 
     body = clam_obj.resc.message("get_gather_path_body")
     dest = libClarisseGui.display_get_path_dialog(body)
 
+    # Called from a worker thread, so it only prints (never touches clarisse)
+    def finished(job):
+        if job.status == jobqueue.DONE:
+            message = clam_obj.resc.message("job_done")
+        elif job.status == jobqueue.CANCELLED:
+            message = clam_obj.resc.message("job_cancelled")
+        else:
+            message = clam_obj.resc.message("job_failed")
+        print(message.format(kind=job.kind, name=job.name, error=job.error))
+
+    job_queue = jobqueue.get_queue(clam_obj)
+
     for context in contexts:
         try:
-            clam_obj.gather_context(context, dest)
+            job_queue.submit_gather(context, dest, callback=finished)
         except ClamError as e:
             libClarisseGui.display_error_dialog(e.message, "Error")
             return
 
-    title = clam_obj.resc.message("done_gathering_title")
-    body = clam_obj.resc.message("done_gathering_body")
+    title = clam_obj.resc.message("jobs_queued_title")
+    body = clam_obj.resc.message("jobs_queued_body")
+    body = body.format(count=len(contexts))
     libClarisseGui.display_message_dialog(body, title)
 
 
@@ -1,6 +1,7 @@
 import os
 
 from clam import clam
+from clam import jobqueue
 from clam.clamerror import ClamError
 
 from libClarisse import libClarisse
@@ -14,26 +15,63 @@ def do_it():
     else:
         language = "english"
 
-    clam_obj = clam.Clam(language)
+    clam_obj = clam.get_clam(language)
     contexts = libClarisse.selection_to_context_list()
 
-    result = False
-    if contexts:
-        result = clam_obj.validate_context_names(contexts, None, False)
+    if not contexts:
+        return
 
-    published = list()
-    if result:
-        for context in contexts:
-            try:
-                clam_obj.publish_context(context)
-            except ClamError as e:
-                title = clam_obj.resc.message("error")
-                libClarisseGui.display_error_dialog(title, e.message)
-            published.append(context)
+    # Called from a worker thread, so it only prints (never touches clarisse)
+    def finished(job):
+        if job.status == jobqueue.CANCELLED:
+            message = clam_obj.resc.message("job_cancelled")
+            print(message.format(kind=job.kind, name=job.name))
+            return
+        if job.status == jobqueue.FAILED:
+            message = clam_obj.resc.message("job_failed")
+            print(message.format(kind=job.kind, name=job.name, error=job.error))
+            return
+        for publish_result in job.result:
+            if publish_result.success:
+                message = clam_obj.resc.message("job_done")
+            else:
+                message = clam_obj.resc.message("job_failed")
+            print(message.format(kind=job.kind,
+                                 name=publish_result.name,
+                                 error=publish_result.error))
 
-    title = clam_obj.resc.message("publish_success_title")
-    body = clam_obj.resc.message("publish_success_body")
-    libClarisseGui.display_message_dialog(body, title)
+    job_queue = jobqueue.get_queue(clam_obj)
 
+    # A single job publishes the whole batch (see Clam.publish_exported)
+    try:
+        job = job_queue.submit_publish(contexts, callback=finished)
+    except ClamError as e:
+        libClarisseGui.display_error_dialog(e.message,
+                                            clam_obj.resc.message("error"))
+        return
+
+    # Contexts with invalid names (or that could not be exported) fail at once
+    failed = ""
+    queued = 0
+    for publish_result in job.result:
+        if publish_result.error is None:
+            queued += 1
+            continue
+        failed += "\n    \""
+        failed += publish_result.name
+        failed += "\" - "
+        failed += str(publish_result.error)
+
+    if failed:
+        title = clam_obj.resc.message("error")
+        body = clam_obj.resc.message("failed_publish_body")
+        body = body.format(failed=failed)
+        libClarisseGui.display_error_dialog(body, title)
+
+    if queued:
+        title = clam_obj.resc.message("jobs_queued_title")
+        body = clam_obj.resc.message("jobs_queued_body")
+        body = body.format(count=queued)
+        libClarisseGui.display_message_dialog(body, title)
 
 do_it()
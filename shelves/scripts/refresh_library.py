@@ -0,0 +1,23 @@
+import os
+
+from clam import clam
+
+from libClarisse import libClarisseGui
+
+
+def do_it():
+
+    if "CLAM_LANGUAGE" in os.environ:
+        language = os.environ["CLAM_LANGUAGE"]
+    else:
+        language = "english"
+
+    clam_obj = clam.get_clam(language)
+    clam.invalidate_librarians()
+
+    title = clam_obj.resc.message("library_refreshed_title")
+    body = clam_obj.resc.message("library_refreshed_body")
+    libClarisseGui.display_message_dialog(body, title)
+
+
+do_it()
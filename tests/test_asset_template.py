@@ -0,0 +1,492 @@
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+TESTS_D = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(TESTS_D, "..", "modules",
+                                                "clam")))
+
+import assetbuilder
+import assettemplate
+
+TEMPLATE_P = os.path.abspath(os.path.join(TESTS_D, "..", "config",
+                                          "asset_template.config"))
+
+
+# ==============================================================================
+class FakeItem(object):
+
+    """
+    Stands in for a clarisse item: only its full name is used.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 full_name):
+
+        self.full_name = full_name
+
+    # --------------------------------------------------------------------------
+    def get_full_name(self):
+
+        return self.full_name
+
+
+# ==============================================================================
+class RecordingIx(object):
+
+    """
+    Stands in for clarisse's ix module (and libClarisse.create_context),
+    recording what every command does to the scene. Commands that do the same
+    thing one item at a time or in a batch (i.e. SetValues with one or many
+    attributes, MoveItemTo and MoveItemsTo) are recorded the same way, so that
+    the old and the batched way of building an asset can be compared.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+
+        self.cmds = self
+        self.contexts = list()
+        self.objects = list()
+        self.set_values = list()
+        self.add_values = list()
+        self.moves = list()
+        self.shading_commands = list()
+        self.batches = 0
+
+    # --------------------------------------------------------------------------
+    def begin_command_batch(self,
+                            name):
+
+        self.batches += 1
+
+    # --------------------------------------------------------------------------
+    def end_command_batch(self):
+
+        pass
+
+    # --------------------------------------------------------------------------
+    def create_context(self,
+                       url):
+
+        self.contexts.append(url)
+        return FakeItem(url)
+
+    # --------------------------------------------------------------------------
+    def CreateObject(self,
+                     name,
+                     class_name,
+                     *args):
+
+        self.objects.append((name, class_name) + args)
+        return FakeItem(args[-1] + "/" + name)
+
+    # --------------------------------------------------------------------------
+    def SetValues(self,
+                  attrs,
+                  values):
+
+        self.set_values.extend(zip(attrs, values))
+
+    # --------------------------------------------------------------------------
+    def AddValues(self,
+                  attrs,
+                  values):
+
+        self.add_values.extend(zip(attrs, values))
+
+    # --------------------------------------------------------------------------
+    def MoveItemTo(self,
+                   item_name,
+                   dest_url):
+
+        self.moves.append((item_name, dest_url))
+
+    # --------------------------------------------------------------------------
+    def MoveItemsTo(self,
+                    item_names,
+                    dest_url):
+
+        for item_name in item_names:
+            self.moves.append((item_name, dest_url))
+
+    # --------------------------------------------------------------------------
+    def AddShadingLayerRule(self,
+                            *args):
+
+        self.shading_commands.append(("AddShadingLayerRule",) + args)
+
+    # --------------------------------------------------------------------------
+    def SetShadingLayerRulesProperty(self,
+                                     *args):
+
+        self.shading_commands.append(("SetShadingLayerRulesProperty",) + args)
+
+    # --------------------------------------------------------------------------
+    def scene(self):
+        """
+        :return: Everything recorded, with the things whose order does not
+                 matter sorted. Contexts stay in order (parents must come
+                 first) and so do the shading layer commands.
+        """
+
+        return {"contexts": self.contexts,
+                "objects": sorted(self.objects),
+                "set_values": sorted(self.set_values),
+                "add_values": sorted(self.add_values),
+                "moves": sorted(self.moves),
+                "shading_commands": self.shading_commands}
+
+
+# ------------------------------------------------------------------------------
+def old_asset_structure(ix,
+                        name,
+                        variant_count,
+                        context_url,
+                        existing_geo):
+    """
+    The asset structure clam used to build with hard-coded clarisse commands
+    (before the layout moved into config/asset_template.config).
+
+    :param ix: The (recording) ix module.
+    :param name: The name of the asset.
+    :param variant_count: The number of variants.
+    :param context_url: The url of the context the asset is created in.
+    :param existing_geo: A list of existing items to move into the variants.
+
+    :return: Nothing.
+    """
+
+    asset_url = "/".join([context_url, name])
+
+    geo_url = "/".join([asset_url, "geo"])
+    var_urls = list()
+    shading_url = "/".join([asset_url, "shading"])
+    maps_url = "/".join([shading_url, "maps"])
+    support_url = "/".join([shading_url, "support"])
+    shaders_url = "/".join([shading_url, "shaders"])
+
+    ix.create_context(asset_url)
+    ix.create_context(geo_url)
+    ix.create_context(shading_url)
+    ix.create_context(maps_url)
+    ix.create_context(support_url)
+    ix.create_context(shaders_url)
+
+    for i in range(variant_count):
+        var_n = "var" + str(i + 1)
+        var_url = "/".join([geo_url, var_n])
+        var_urls.append(var_url)
+        ix.create_context(var_url)
+
+        geo_gr = ix.cmds.CreateObject("geo_gr",
+                                      "Group",
+                                      "Global",
+                                      var_url)
+
+        geo_gr_n = geo_gr.get_full_name()
+
+        ix.cmds.SetValues([geo_gr_n + ".inclusion_rule[0]"],
+                          ["./*"])
+        ix.cmds.SetValues([geo_gr_n + ".exclusion_rule[0]"],
+                          ["*_HDN*"])
+
+        out_combiner = ix.cmds.CreateObject(
+            name + "_" + var_n + "_OUT",
+            "SceneObjectCombiner",
+            "Global",
+            asset_url)
+
+        ix.cmds.AddValues([out_combiner.get_full_name() + ".objects"],
+                          [geo_gr_n])
+
+    if existing_geo:
+        i = 0
+        for existing in existing_geo:
+            ix.cmds.MoveItemTo(existing.get_full_name(), var_urls[i])
+            i += 1
+
+    material = ix.cmds.CreateObject(name + "_MAT",
+                                    "MaterialPhysicalStandard",
+                                    shaders_url)
+
+    shading_layer = ix.cmds.CreateObject(name + "_sl",
+                                         "ShadingLayer",
+                                         "Global",
+                                         asset_url)
+
+    ix.cmds.AddShadingLayerRule(shading_layer.get_full_name(),
+                                0,
+                                ["filter", "", "is_visible", "1"])
+
+    ix.cmds.SetShadingLayerRulesProperty(shading_layer.get_full_name(),
+                                         [0],
+                                         "filter",
+                                         ["*/" + name + "/geo/*"])
+
+    ix.cmds.SetShadingLayerRulesProperty(shading_layer.get_full_name(),
+                                         [0], "material",
+                                         [material.get_full_name()])
+
+
+# ==============================================================================
+class TestShippedTemplate(unittest.TestCase):
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+
+        self.ix = RecordingIx()
+
+        # AssetBuilder.build imports libClarisse for create_context
+        self.saved_modules = dict((name, sys.modules.get(name)) for name in
+                                  ("libClarisse", "libClarisse.libClarisse"))
+        lib_clarisse = types.ModuleType("libClarisse.libClarisse")
+        lib_clarisse.create_context = self.ix.create_context
+        package = types.ModuleType("libClarisse")
+        package.libClarisse = lib_clarisse
+        sys.modules["libClarisse"] = package
+        sys.modules["libClarisse.libClarisse"] = lib_clarisse
+
+        self.saved_ix = assetbuilder.ix
+        assetbuilder.ix = self.ix
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+
+        assetbuilder.ix = self.saved_ix
+        for name, module in self.saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    # --------------------------------------------------------------------------
+    def build(self,
+              names,
+              variant_count,
+              existing_geo=None):
+        """
+        Builds assets from the shipped template.
+
+        :param names: A list of asset names.
+        :param variant_count: The number of variants of each asset.
+        :param existing_geo: A list of existing items to move into the first
+               asset. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        template = assettemplate.AssetTemplate(TEMPLATE_P)
+        builder = assetbuilder.AssetBuilder()
+        for i, name in enumerate(names):
+            existing_names = None
+            if existing_geo and i == 0:
+                existing_names = [item.get_full_name() for
+                                  item in existing_geo]
+            builder.add(template.plan(name=name,
+                                      context_url="project://scene",
+                                      variant_count=variant_count,
+                                      existing_geo=existing_names))
+        builder.build()
+
+    # --------------------------------------------------------------------------
+    def assert_matches_old(self,
+                           names,
+                           variant_count,
+                           existing_geo=None):
+        """
+        Checks that building assets from the shipped template does the same
+        thing to the scene as the old hard-coded commands.
+
+        :param names: A list of asset names.
+        :param variant_count: The number of variants of each asset.
+        :param existing_geo: A list of existing items to move into the first
+               asset. Defaults to None.
+
+        :return: Nothing.
+        """
+
+        self.build(names, variant_count, existing_geo)
+
+        old_ix = RecordingIx()
+        for i, name in enumerate(names):
+            old_asset_structure(old_ix, name, variant_count, "project://scene",
+                                existing_geo if i == 0 else None)
+
+        new_scene = self.ix.scene()
+        old_scene = old_ix.scene()
+        for key in old_scene:
+            self.assertEqual(new_scene[key], old_scene[key], key)
+        self.assertEqual(self.ix.batches, 1)
+
+    # --------------------------------------------------------------------------
+    def test_one_variant(self):
+
+        self.assert_matches_old(["prp_chair"], 1)
+
+    # --------------------------------------------------------------------------
+    def test_several_variants_with_existing_geo(self):
+
+        existing_geo = [FakeItem("project://scene/chair_a"),
+                        FakeItem("project://scene/chair_b")]
+        self.assert_matches_old(["prp_chair"], 3, existing_geo)
+
+    # --------------------------------------------------------------------------
+    def test_several_assets(self):
+
+        self.assert_matches_old(["prp_chair", "prp_table"], 2)
+
+
+# ==============================================================================
+class TestTemplateValidation(unittest.TestCase):
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+
+        self.temp_d = tempfile.mkdtemp()
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self.temp_d)
+
+    # --------------------------------------------------------------------------
+    def template(self,
+                 text):
+        """
+        Writes a template file.
+
+        :param text: The contents of the template.
+
+        :return: The path to the template.
+        """
+
+        template_p = os.path.join(self.temp_d, "asset_template.config")
+        with open(template_p, "w") as f:
+            f.write(text)
+        return template_p
+
+    # --------------------------------------------------------------------------
+    def assert_invalid(self,
+                       text,
+                       problem):
+        """
+        Checks that a template is rejected.
+
+        :param text: The contents of the template.
+        :param problem: Text that the error message must contain.
+
+        :return: Nothing.
+        """
+
+        with self.assertRaises(ValueError) as context:
+            assettemplate.AssetTemplate(self.template(text))
+        self.assertIn(problem, str(context.exception))
+
+    # --------------------------------------------------------------------------
+    def test_valid_template(self):
+
+        template = assettemplate.AssetTemplate(self.template(
+            "[context:geo]\n"
+            "path=geo\n"
+            "[object:group]\n"
+            "name={name}_gr\n"
+            "class=Group\n"
+            "parent=geo\n"))
+        self.assertEqual([op[0] for op in template.ops], ["context", "object"])
+
+    # --------------------------------------------------------------------------
+    def test_missing_file(self):
+
+        missing_p = os.path.join(self.temp_d, "missing.config")
+        with self.assertRaises(ValueError):
+            assettemplate.AssetTemplate(missing_p)
+        with self.assertRaises(ValueError):
+            assettemplate.load_template(missing_p)
+
+    # --------------------------------------------------------------------------
+    def test_not_an_ini_file(self):
+
+        self.assert_invalid("path=geo\n", "")
+
+    # --------------------------------------------------------------------------
+    def test_unknown_kind(self):
+
+        self.assert_invalid("[light:key]\npath=geo\n", "Unknown section")
+
+    # --------------------------------------------------------------------------
+    def test_missing_key(self):
+
+        self.assert_invalid("[context]\npath=geo\n", "needs a key")
+
+    # --------------------------------------------------------------------------
+    def test_missing_option(self):
+
+        self.assert_invalid("[context:geo]\n", "missing the \"path\" option")
+
+    # --------------------------------------------------------------------------
+    def test_undefined_reference(self):
+
+        self.assert_invalid("[object:group]\n"
+                            "name=gr\n"
+                            "class=Group\n"
+                            "parent=geo\n",
+                            "not defined above it")
+
+    # --------------------------------------------------------------------------
+    def test_per_variant_reference(self):
+
+        self.assert_invalid("[context:var]\n"
+                            "path=geo/{var}\n"
+                            "per_variant=True\n"
+                            "[object:group]\n"
+                            "name=gr\n"
+                            "class=Group\n"
+                            "parent=var\n",
+                            "is per variant")
+
+    # --------------------------------------------------------------------------
+    def test_undefined_object_reference(self):
+
+        self.assert_invalid("[object:out]\n"
+                            "name=out\n"
+                            "class=SceneObjectCombiner\n"
+                            "parent=asset\n"
+                            "add.objects=@group\n",
+                            "not defined above it")
+
+    # --------------------------------------------------------------------------
+    def test_bad_placeholder(self):
+
+        self.assert_invalid("[context:geo]\npath={asset}\n",
+                            "Bad placeholder")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+TESTS_D = os.path.dirname(os.path.abspath(__file__))
+MODULES_D = os.path.abspath(os.path.join(TESTS_D, "..", "modules"))
+CLAM_D = os.path.join(MODULES_D, "clam")
+
+# How long importing clam may take (in milliseconds), not counting the
+# packages clam is built on (which it does not control) or the modules the
+# interpreter had already loaded on start up. Slow machines may raise it
+# with the CLAM_IMPORT_BUDGET_MS environment variable.
+IMPORT_BUDGET_MS = float(os.environ.get("CLAM_IMPORT_BUDGET_MS", 75))
+
+# Packages whose import cost is not clam's.
+THIRD_PARTY = ["bvzlib", "squirrel", "libClarisse"]
+
+# Modules that are slow to import and must only be imported by the operations
+# that need them (never by "import clam").
+LAZY_MODULES = ["libClarisse",
+                "squirrel.gather",
+                "squirrel.librarian",
+                "multiprocessing.pool",
+                "sqlite3",
+                "refindex",
+                "copier",
+                "manifest"]
+
+# The number of times the import is timed. The fastest run is used.
+RUNS = 3
+
+
+# ------------------------------------------------------------------------------
+def python_env():
+    """
+    Builds the environment to run the child pythons in: clam (and the modules
+    directory) ahead of whatever PYTHONPATH the tests were started with.
+
+    :return: A dict of environment variables.
+    """
+
+    env = dict(os.environ)
+    paths = [CLAM_D, MODULES_D]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    # Time the import of compiled modules, not the compile.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+# ------------------------------------------------------------------------------
+def run_python(args):
+    """
+    Runs a child python with clam on its path.
+
+    :param args: The arguments to pass to python.
+
+    :return: A tuple of (return code, stdout, stderr).
+    """
+
+    process = subprocess.Popen([sys.executable] + args,
+                               env=python_env(),
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+
+# ------------------------------------------------------------------------------
+def parse_importtime(output):
+    """
+    Parses the output of python -X importtime.
+
+    :param output: The stderr of the python that was run with -X importtime.
+
+    :return: A dict of the self time (in microseconds) of each module that was
+             imported, keyed on the module name.
+    """
+
+    self_times = dict()
+    for line in output.splitlines():
+        result = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)",
+                          line)
+        if result:
+            self_times[result.group(3)] = int(result.group(1))
+    return self_times
+
+
+# ------------------------------------------------------------------------------
+def importtime_supported():
+    """
+    :return: True if this python can report import times (3.7 and later).
+    """
+
+    return sys.version_info >= (3, 7)
+
+
+# ==============================================================================
+class TestImportTime(unittest.TestCase):
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+
+        code, stdout, stderr = run_python(["-c", "import clam"])
+        if code != 0:
+            self.skipTest("clam cannot be imported here (are bvzlib and "
+                          "squirrel on the PYTHONPATH?): " +
+                          stderr.strip().splitlines()[-1])
+
+    # --------------------------------------------------------------------------
+    def test_lazy_modules_are_not_imported(self):
+
+        script = ("import sys\n"
+                  "before = set(sys.modules)\n"
+                  "import clam\n"
+                  "for name in {lazy!r}:\n"
+                  "    if name in sys.modules and name not in before:\n"
+                  "        print(name)\n").format(lazy=LAZY_MODULES)
+        code, stdout, stderr = run_python(["-c", script])
+        self.assertEqual(code, 0, stderr)
+        self.assertEqual(stdout.split(), [],
+                         "import clam imported modules it should import "
+                         "lazily")
+
+    # --------------------------------------------------------------------------
+    def test_import_time_is_within_budget(self):
+
+        if not importtime_supported():
+            self.skipTest("python -X importtime needs python 3.7 or later")
+
+        code, stdout, stderr = run_python(["-X", "importtime", "-c", "pass"])
+        self.assertEqual(code, 0, stderr)
+        startup_modules = set(parse_importtime(stderr))
+
+        fastest_ms = None
+        for _ in range(RUNS):
+            code, stdout, stderr = run_python(["-X", "importtime",
+                                               "-c", "import clam"])
+            self.assertEqual(code, 0, stderr)
+            self_times = parse_importtime(stderr)
+            self.assertIn("clam", self_times)
+            total_ms = sum(self_time for name, self_time in self_times.items()
+                           if name not in startup_modules and
+                           name.split(".")[0] not in THIRD_PARTY) / 1000.0
+            if fastest_ms is None or total_ms < fastest_ms:
+                fastest_ms = total_ms
+
+        self.assertLess(fastest_ms, IMPORT_BUDGET_MS,
+                        "import clam took {0:.1f} ms (budget {1:.1f} ms)"
+                        "".format(fastest_ms, IMPORT_BUDGET_MS))
+
+
+if __name__ == "__main__":
+    unittest.main()
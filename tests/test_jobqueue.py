@@ -0,0 +1,300 @@
+"""
+License
+--------------------------------------------------------------------------------
+squirrel is released under version 3 of the GNU General Public License.
+
+squirrel
+Copyright (C) 2019  Bernhard VonZastrow
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+TESTS_D = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(TESTS_D, "..", "modules",
+                                                "clam")))
+
+try:
+    import jobqueue
+except ImportError:
+    # squirrel is not on the PYTHONPATH
+    jobqueue = None
+
+from clamerror import ClamError
+import publisher
+
+# How long to wait for a job before giving up on it (in seconds).
+TIMEOUT = 10
+
+
+# ==============================================================================
+class FakeContext(object):
+
+    """
+    Stands in for a clarisse context: only its name is used by the queue.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 name):
+
+        self.name = name
+
+    # --------------------------------------------------------------------------
+    def get_name(self):
+
+        return self.name
+
+
+# ==============================================================================
+class FakeClam(object):
+
+    """
+    Stands in for a Clam object, so that the queue can be tested without
+    clarisse or a librarian. Exporting a context writes an empty project to a
+    temp directory. Gathers and publishes wait until they are released, so a
+    test can hold a job in the running state.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self,
+                 temp_d):
+
+        self.temp_d = temp_d
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        self.gathered = list()
+        self.error = None
+
+    # --------------------------------------------------------------------------
+    def export_context(self,
+                       context):
+
+        exported_p = os.path.join(self.temp_d, context.get_name() + ".project")
+        with open(exported_p, "w") as f:
+            f.write("")
+        return exported_p
+
+    # --------------------------------------------------------------------------
+    def gather_exported_context(self,
+                                exported_p,
+                                name,
+                                dest):
+
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        if self.error is not None:
+            raise self.error
+        os.remove(exported_p)
+        self.gathered.append(name)
+        return os.path.join(dest, name)
+
+    # --------------------------------------------------------------------------
+    def export_for_publish(self,
+                           contexts,
+                           repo):
+
+        results = list()
+        exports = list()
+        for context in contexts:
+            result = publisher.PublishResult(context.get_name())
+            results.append(result)
+            exports.append((result, self.export_context(context)))
+        return results, iter(exports)
+
+    # --------------------------------------------------------------------------
+    def publish_exported(self,
+                         exports,
+                         repo,
+                         workers,
+                         total,
+                         cancelled):
+
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        for result, exported_p in exports:
+            if cancelled():
+                result.fail("cancelled")
+                continue
+            os.remove(exported_p)
+            result.published = True
+
+
+# ==============================================================================
+@unittest.skipIf(jobqueue is None, "squirrel is not on the PYTHONPATH")
+class TestJobQueue(unittest.TestCase):
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+
+        self.temp_d = tempfile.mkdtemp()
+        self.clam_obj = FakeClam(self.temp_d)
+        self.queue = jobqueue.JobQueue(self.clam_obj)
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+
+        self.clam_obj.release.set()
+        self.queue.shutdown()
+        shutil.rmtree(self.temp_d)
+
+    # --------------------------------------------------------------------------
+    def hold_worker(self):
+        """
+        Queues a gather that keeps the (only) worker busy until released.
+
+        :return: The job.
+        """
+
+        self.clam_obj.release.clear()
+        job = self.queue.submit_gather(FakeContext("blocker"), "/gather")
+        self.assertTrue(self.clam_obj.started.wait(TIMEOUT))
+        return job
+
+    # --------------------------------------------------------------------------
+    def test_gather_status(self):
+
+        job = self.queue.submit_gather(FakeContext("chair"), "/gather")
+
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(job.status, jobqueue.DONE)
+        self.assertEqual(job.kind, "gather")
+        self.assertEqual(job.name, "chair")
+        self.assertEqual(job.result, os.path.join("/gather", "chair"))
+        self.assertEqual(self.queue.active_jobs(), [])
+
+    # --------------------------------------------------------------------------
+    def test_status_while_queued_and_running(self):
+
+        blocker = self.hold_worker()
+        job = self.queue.submit_gather(FakeContext("chair"), "/gather")
+
+        self.assertEqual(blocker.status, jobqueue.RUNNING)
+        self.assertEqual(job.status, jobqueue.QUEUED)
+        self.assertFalse(job.done())
+        self.assertEqual(self.queue.active_jobs(), [blocker, job])
+
+        self.clam_obj.release.set()
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(blocker.status, jobqueue.DONE)
+        self.assertEqual(job.status, jobqueue.DONE)
+
+    # --------------------------------------------------------------------------
+    def test_failed_job(self):
+
+        self.clam_obj.error = ClamError("Disk full", 42)
+        job = self.queue.submit_gather(FakeContext("chair"), "/gather")
+
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(job.status, jobqueue.FAILED)
+        self.assertEqual(job.error, "Disk full")
+        self.assertEqual(job.error_code, 42)
+
+    # --------------------------------------------------------------------------
+    def test_cancel_queued_gather(self):
+
+        self.hold_worker()
+        job = self.queue.submit_gather(FakeContext("chair"), "/gather")
+        exported_p = os.path.join(self.temp_d, "chair.project")
+        self.assertTrue(os.path.exists(exported_p))
+
+        job.cancel()
+        self.clam_obj.release.set()
+
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(job.status, jobqueue.CANCELLED)
+        self.assertNotIn("chair", self.clam_obj.gathered)
+        self.assertFalse(os.path.exists(exported_p))
+
+    # --------------------------------------------------------------------------
+    def test_cancel_queued_publish(self):
+
+        self.hold_worker()
+        job = self.queue.submit_publish([FakeContext("chair"),
+                                         FakeContext("table")])
+        exported_ps = [os.path.join(self.temp_d, name + ".project") for
+                       name in ("chair", "table")]
+
+        job.cancel()
+        self.clam_obj.release.set()
+
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(job.status, jobqueue.CANCELLED)
+        for exported_p in exported_ps:
+            self.assertFalse(os.path.exists(exported_p))
+
+    # --------------------------------------------------------------------------
+    def test_cancel_running_publish(self):
+
+        self.clam_obj.release.clear()
+        job = self.queue.submit_publish([FakeContext("chair"),
+                                         FakeContext("table")])
+        self.assertTrue(self.clam_obj.started.wait(TIMEOUT))
+
+        job.cancel()
+        self.clam_obj.release.set()
+
+        self.assertTrue(job.wait(TIMEOUT))
+        self.assertEqual(job.status, jobqueue.CANCELLED)
+        self.assertEqual([result.success for result in job.result],
+                         [False, False])
+        self.assertEqual(os.listdir(self.temp_d), [])
+
+    # --------------------------------------------------------------------------
+    def test_callback(self):
+
+        called = list()
+        finished = threading.Event()
+
+        def callback(job):
+            called.append((job, job.status, job.done()))
+            finished.set()
+
+        job = self.queue.submit_publish([FakeContext("chair")],
+                                        callback=callback)
+
+        self.assertTrue(finished.wait(TIMEOUT))
+        self.assertEqual(called, [(job, jobqueue.DONE, True)])
+        self.assertEqual([result.success for result in job.result], [True])
+
+    # --------------------------------------------------------------------------
+    def test_callback_when_cancelled(self):
+
+        called = list()
+        finished = threading.Event()
+
+        def callback(job):
+            called.append(job)
+            finished.set()
+
+        self.hold_worker()
+        job = self.queue.submit_gather(FakeContext("chair"), "/gather",
+                                       callback=callback)
+        job.cancel()
+        self.clam_obj.release.set()
+
+        self.assertTrue(finished.wait(TIMEOUT))
+        self.assertEqual(called, [job])
+        self.assertEqual(job.status, jobqueue.CANCELLED)
+
+
+if __name__ == "__main__":
+    unittest.main()